@@ -1,111 +1,474 @@
 # backend/backboard.py
-from typing import Any, Dict, Iterable, List, Optional
+import asyncio
+import itertools
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
 import httpx
 from fastapi import HTTPException
 
-DEFAULT_API_BASE_URL = "https://app.backboard.io/api"
+from backend import serialization
+from backend.cache import TTLCache
+from backend.config import DEFAULT_API_BASE_URL
+
+try:
+    import h2  # noqa: F401  (httpx only speaks HTTP/2 when h2 is installed; merchant_intel reuses this flag)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Connection pool and timeouts for the shared Backboard client. Connect and pool waits are kept
+# short so a slow Backboard read never holds up acquiring a connection for another call.
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=60.0)
+_HTTP_TIMEOUT = httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0)
+
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+_MEMORY_CACHE_TTL = 30.0  # seconds a memory listing may be revalidated instead of refetched
+_QUERY_CACHE_TTL = 30.0  # seconds a query_memories result is reused for the same assistant + query
+_QUERY_CACHE_MAX_ASSISTANTS = 1024
+_QUERY_CACHE_MAX_PER_ASSISTANT = 32
+
+# Retries for passes where every candidate failed with a network error or 5xx. Idempotent calls
+# retry on any network error or a 502/503/504; writes only when the request never left the client.
+_MAX_RETRIES = 2
+_RETRYABLE_STATUSES = frozenset({502, 503, 504})
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+_RETRY_BASE_DELAY = 0.2
+_RETRY_MAX_DELAY = 2.0
+
+# Keys probed when digging text / memories out of loosely-shaped Backboard payloads.
+_ASSISTANT_TEXT_KEYS = ("assistant_text", "assistant_response", "response", "text", "content", "message")
+_RETRIEVAL_KEYS = ("retrieved_memories", "retrievedMemories", "memory_hits", "retrievals", "results")
+_RETRIEVAL_NESTED_KEYS = ("data", "message", "response", "raw_response", "run", "output")
+_MEMORY_TEXT_KEYS = ("content", "memory", "text")
+_ASSISTANT_ID_KEYS = ("id", "assistant_id", "assistantId")
+_THREAD_ID_KEYS = ("id", "thread_id", "threadId")
+_TP_PREFIX = "tp_"
+_TP_BUCKET = "tp"
+_MEM_LOOKUP_PREFIX = "Memory lookup. Reply only with 'OK'.\nQuery: "
+_MEM_LOOKUP_SUFFIX = "\nDo not store this message as a user memory."
+
+# send_message path candidates, in probe order; {tid} / {aid} are filled per call.
+_MESSAGE_PATHS_NO_ASSISTANT = (
+    "threads/{tid}/messages",
+    "v1/threads/{tid}/messages",
+    "api/v1/threads/{tid}/messages",
+    "messages",
+    "v1/messages",
+    "api/v1/messages",
+)
+_MESSAGE_PATHS = (
+    "threads/{tid}/messages",
+    "v1/threads/{tid}/messages",
+    "api/v1/threads/{tid}/messages",
+    "assistants/{aid}/threads/{tid}/messages",
+    "api/assistants/{aid}/threads/{tid}/messages",
+    "v1/assistants/{aid}/threads/{tid}/messages",
+    "api/v1/assistants/{aid}/threads/{tid}/messages",
+    "messages",
+    "v1/messages",
+    "api/v1/messages",
+)
+
+
+class _MemoryListing(NamedTuple):
+    validator: Tuple[str, str]  # conditional request header + value, e.g. ("If-None-Match", etag)
+    expires_at: float
+    memories: List[Dict[str, Any]]
+    buckets: Dict[str, List[Dict[str, Any]]]
+
+
+def _extract_id(payload: Any, keys: Tuple[str, ...]) -> Optional[str]:
+    # Only the id fields matter in create responses; probe them directly, then data.id.
+    if not isinstance(payload, dict):
+        return None
+    for key in keys:
+        val = payload.get(key)
+        if val:
+            return str(val)
+    data = payload.get("data")
+    if isinstance(data, dict) and data.get("id"):
+        return str(data["id"])
+    return None
+
+
+def _wrap_memory_item(x: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(x, dict):
+        content = x.get("content") or x.get("memory") or x.get("text")
+        if isinstance(content, str):
+            content = content.strip()
+            if content:
+                # One copy of the item, then swap the text keys for "memory".
+                item = dict(x)
+                for k in _MEMORY_TEXT_KEYS:
+                    item.pop(k, None)
+                item["memory"] = content
+                return item
+        return None
+    if isinstance(x, str):
+        x = x.strip()
+        if x:
+            return {"memory": x}
+    return None
+
+
+def _norm_memory_list(lst: Any) -> List[Dict[str, Any]]:
+    if not isinstance(lst, list):
+        return []
+    out = []
+    for x in lst:
+        if isinstance(x, dict):
+            out.append(x)
+        elif isinstance(x, str) and x.strip():
+            out.append({"memory": x.strip()})
+    return out
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a rolling window of call outcomes.
+
+    Opens once at least ``request_volume_threshold`` of the last ``window_size`` calls
+    were seen and ``error_threshold_percentage`` of them failed. While open every call
+    is refused until ``sleep_window`` seconds pass; then a single trial call is let
+    through (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(
+        self,
+        *,
+        request_volume_threshold: int = 5,
+        error_threshold_percentage: float = 50.0,
+        sleep_window: float = 10.0,
+        window_size: int = 20,
+    ):
+        self.request_volume_threshold = request_volume_threshold
+        self.error_threshold_percentage = error_threshold_percentage
+        self.sleep_window = sleep_window
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._trial_in_flight or time.monotonic() - self._opened_at >= self.sleep_window:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if not self._trial_in_flight and time.monotonic() - self._opened_at >= self.sleep_window:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def on_success(self) -> None:
+        if self._opened_at is not None:
+            self._opened_at = None
+            self._trial_in_flight = False
+            self._outcomes.clear()
+        self._outcomes.append(True)
+
+    def on_abandoned(self) -> None:
+        # The call ended without a verdict (e.g. it was cancelled): free the half-open trial slot
+        # so the next call can probe instead of being refused forever.
+        self._trial_in_flight = False
+
+    def on_failure(self) -> None:
+        if self._opened_at is not None:
+            # Failed half-open trial: stay open for another sleep window.
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+            return
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+        if (
+            len(self._outcomes) >= self.request_volume_threshold
+            and failures * 100.0 / len(self._outcomes) >= self.error_threshold_percentage
+        ):
+            self._opened_at = time.monotonic()
 
 
 class BackboardClient:
     def __init__(self, api_key: Optional[str], api_base_url: Optional[str] = None):
         self.api_key = api_key
         self.api_base_url = (api_base_url or DEFAULT_API_BASE_URL).rstrip("/")
-        self._client = httpx.AsyncClient(timeout=httpx.Timeout(30.0))
+        headers = {"Accept": "application/json"}
+        if api_key:
+            headers["X-API-Key"] = api_key
+            headers["x-api-key"] = api_key
+        # One pooled keep-alive client per BackboardClient; HTTP/2 lets concurrent calls share a
+        # connection. Auth headers are client defaults, so requests only carry per-call extras.
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=_HTTP_LIMITS,
+            timeout=_HTTP_TIMEOUT,
+            headers=headers,
+        )
+        # (method, operation) -> index of the path candidate that last succeeded
+        self._endpoint_cache: Dict[Tuple[str, Any], int] = {}
+        # assistant_id -> last memory listing, revalidated with ETag / Last-Modified
+        self._mem_cache: Dict[str, _MemoryListing] = {}
+        # assistant_id -> TTLCache {(query, top_k): memories}; dropped whenever a memory is added
+        self._query_cache = TTLCache(maxsize=_QUERY_CACHE_MAX_ASSISTANTS)
+        self._query_inflight: Dict[Tuple[str, str, str, int], "asyncio.Future[List[Dict[str, Any]]]"] = {}
+        # assistant_id -> stamp of its latest add_memory. Reads only cache what they fetched if the
+        # stamp is unchanged, so a listing started before a write is never stored after it.
+        self._generation = TTLCache(maxsize=_QUERY_CACHE_MAX_ASSISTANTS)
+        self._generation_counter = itertools.count(1)
+        self._breaker = CircuitBreaker()
 
     async def aclose(self) -> None:
         await self._client.aclose()
 
-    def _headers(self) -> Dict[str, str]:
-        headers = {"Accept": "application/json"}
-        if self.api_key:
-            headers["X-API-Key"] = self.api_key
-            headers["x-api-key"] = self.api_key
-        return headers
+    async def warm(self) -> None:
+        # Open a pooled connection (TCP, TLS, HTTP/2 negotiation) before the first real call.
+        # The response itself doesn't matter.
+        try:
+            await self._client.head(f"{self.api_base_url}/", timeout=5.0)
+        except httpx.HTTPError:
+            pass
+
+    async def aclear_endpoint_cache(self) -> None:
+        # Forget learned endpoints, e.g. after Backboard moves an API version.
+        self._endpoint_cache.clear()
+
+    def _build_request(
+        self,
+        method: str,
+        path: str,
+        *,
+        content: Optional[bytes] = None,
+        data: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Request:
+        return self._client.build_request(
+            method,
+            f"{self.api_base_url}/{path.lstrip('/')}",
+            content=content,
+            data=data,
+            files=files,
+            headers=headers,
+        )
 
     async def _request_with_fallback(
         self,
         method: str,
         path_candidates: Iterable[str],
         *,
+        cache_key: Optional[str] = None,
         json_payload: Optional[Dict[str, Any]] = None,
         data_payload: Optional[Dict[str, Any]] = None,
         files: Optional[Dict[str, Any]] = None,
     ) -> Any:
-        errors: List[str] = []
+        resp = await self._send_with_fallback(
+            method,
+            path_candidates,
+            cache_key=cache_key,
+            json_payload=json_payload,
+            data_payload=data_payload,
+            files=files,
+        )
+        try:
+            # Decode straight from bytes; skips httpx's text decode step.
+            return serialization.loads(resp.content)
+        except ValueError:
+            raise HTTPException(status_code=502, detail="Backboard returned non-JSON response")
+
+    async def _send_with_fallback(
+        self,
+        method: str,
+        path_candidates: Iterable[str],
+        *,
+        cache_key: Optional[str] = None,
+        json_payload: Optional[Dict[str, Any]] = None,
+        data_payload: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        extra_headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Response:
         if json_payload is not None and data_payload is not None:
             raise ValueError("Provide only one of json_payload or data_payload")
 
-        for path in path_candidates:
-            url = f"{self.api_base_url}/{path.lstrip('/')}"
-            try:
-                resp = await self._client.request(
-                    method,
-                    url,
-                    json=json_payload,
-                    data=data_payload,
-                    files=files,
-                    headers=self._headers(),
-                )
-            except httpx.HTTPError as exc:
-                errors.append(f"{url}: {exc}")
-                continue
+        paths = tuple(path_candidates)  # materialize once: indexed, measured and used as a cache key
+        # Callers without an operation name are keyed by their literal path list.
+        key: Tuple[str, Any] = (method, cache_key or paths)
 
-            if resp.status_code in (401, 403):
-                raise HTTPException(status_code=resp.status_code, detail="Backboard auth failed")
+        # Encode the JSON body once rather than once per candidate URL.
+        headers: Dict[str, str] = dict(extra_headers) if extra_headers else {}
+        content: Optional[bytes] = None
+        if json_payload is not None:
+            content = serialization.dumps(json_payload)
+            headers["Content-Type"] = "application/json"
 
-            if resp.status_code >= 500:
-                errors.append(f"{url}: {resp.status_code} {resp.text}")
-                continue
-
-            if resp.status_code in (404, 405):
-                errors.append(f"{url}: {resp.status_code}")
-                continue
+        def build(idx: int) -> httpx.Request:
+            return self._build_request(method, paths[idx], content=content, data=data_payload, files=files, headers=headers)
 
-            if resp.status_code >= 400:
-                raise HTTPException(status_code=resp.status_code, detail=f"Backboard error: {resp.text}")
+        if not self._breaker.allow():
+            raise HTTPException(status_code=503, detail="Backboard degraded; failing fast while it recovers")
 
-            try:
-                return resp.json()
-            except ValueError:
-                raise HTTPException(status_code=502, detail="Backboard returned non-JSON response")
+        # One breaker outcome per call, recorded on every exit path: True = Backboard answered,
+        # False = it did not, None = no verdict (cancelled or an unexpected error).
+        healthy: Optional[bool] = None
+        errors: List[str] = []
+        try:
+            for attempt in range(_MAX_RETRIES + 1):
+                try:
+                    resp, errors, transient, retryable = await self._probe_candidates(method, paths, key, build)
+                except HTTPException:
+                    healthy = True  # Backboard answered, it just refused the request
+                    raise
+
+                if resp is not None:
+                    healthy = True
+                    return resp
+                if not transient:
+                    healthy = True  # every candidate was a clean 404/405; Backboard itself is up
+                    break
+
+                healthy = False
+                if not retryable or attempt == _MAX_RETRIES:
+                    break
+                # Exponential backoff with jitter so concurrent callers do not retry in lockstep.
+                await asyncio.sleep(min(_RETRY_MAX_DELAY, _RETRY_BASE_DELAY * 2**attempt) * random.uniform(0.5, 1.5))
+        finally:
+            if healthy is True:
+                self._breaker.on_success()
+            elif healthy is False:
+                self._breaker.on_failure()
+            else:
+                self._breaker.on_abandoned()
 
         raise HTTPException(status_code=502, detail=f"Unable to reach Backboard endpoints. Tried: {'; '.join(errors)}")
 
+    async def _probe_candidates(
+        self,
+        method: str,
+        paths: Tuple[str, ...],
+        key: Tuple[str, Any],
+        build: Callable[[int], httpx.Request],
+    ) -> Tuple[Optional[httpx.Response], List[str], bool, bool]:
+        # One pass over the candidates. Returns (response, errors, saw_transient_failure,
+        # safe_to_retry); response is None when no candidate answered usefully. A pass is only
+        # safe to retry when every transient failure could not have applied a write twice.
+        errors: List[str] = []
+        transient = False
+        retryable = True
+        idempotent = method in _IDEMPOTENT_METHODS
+        order = list(range(len(paths)))
+
+        # Try the candidate that worked last time for this operation first.
+        cached = self._endpoint_cache.get(key)
+        if cached is not None and cached < len(paths):
+            order.remove(cached)
+            order.insert(0, cached)
+        else:
+            cached = None
+
+        # On a cold cache, probe idempotent endpoints concurrently. Results are still
+        # consumed in candidate order so the preferred path wins when several succeed.
+        # Non-idempotent calls stay sequential so a create is never sent twice.
+        requests: List[httpx.Request] = []
+        tasks: List["asyncio.Task[httpx.Response]"] = []
+        if cached is None and method in _IDEMPOTENT_METHODS and len(order) > 1:
+            requests = [build(idx) for idx in order]
+            tasks = [asyncio.ensure_future(self._client.send(req)) for req in requests]
+
+        try:
+            for n, idx in enumerate(order):
+                req = requests[n] if tasks else build(idx)
+                url = req.url
+                try:
+                    resp = await (tasks[n] if tasks else self._client.send(req))
+                except httpx.HTTPError as exc:
+                    errors.append(f"{url}: {exc}")
+                    transient = True
+                    retryable = retryable and (idempotent or isinstance(exc, _NOT_SENT_ERRORS))
+                    continue
+
+                if resp.status_code in (401, 403):
+                    raise HTTPException(status_code=resp.status_code, detail="Backboard auth failed")
+
+                if resp.status_code >= 500:
+                    errors.append(f"{url}: {resp.status_code} {resp.text}")
+                    transient = True
+                    retryable = retryable and idempotent and resp.status_code in _RETRYABLE_STATUSES
+                    continue
+
+                if resp.status_code in (404, 405):
+                    errors.append(f"{url}: {resp.status_code}")
+                    continue
+
+                if resp.status_code >= 400:
+                    raise HTTPException(status_code=resp.status_code, detail=f"Backboard error: {resp.text}")
+
+                # Only learn endpoints that actually answered (2xx, or 304 on a revalidation).
+                if resp.is_success or resp.status_code == 304:
+                    self._endpoint_cache[key] = idx
+                return resp, errors, transient, retryable
+
+            # The learned endpoint stopped working and nothing else did either.
+            self._endpoint_cache.pop(key, None)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark as retrieved; losing probes may have failed
+
+        return None, errors, transient, retryable
+
     @staticmethod
     def _extract_assistant_text(payload: Any) -> Optional[str]:
-        if payload is None:
-            return None
-        if isinstance(payload, str) and payload.strip():
-            return payload.strip()
-
-        if isinstance(payload, dict):
-            for key in ("assistant_text", "assistant_response", "response", "text", "content", "message"):
-                val = payload.get(key)
-                if isinstance(val, str) and val.strip():
-                    return val.strip()
-                if isinstance(val, dict):
-                    nested = val.get("content") or val.get("text")
-                    if isinstance(nested, str) and nested.strip():
-                        return nested.strip()
-
-            msgs = payload.get("messages")
-            if isinstance(msgs, list):
-                for m in msgs:
-                    if isinstance(m, dict) and m.get("role") == "assistant":
-                        c = m.get("content") or m.get("text")
-                        if isinstance(c, str) and c.strip():
-                            return c.strip()
-
-            data = payload.get("data")
-            if isinstance(data, dict):
-                return BackboardClient._extract_assistant_text(data)
+        # Fast path for the common {"assistant_text": "..."} shape. Exact type checks are
+        # enough here because anything else still goes through the general walk below.
+        if type(payload) is dict:
+            val = payload.get("assistant_text")
+            if type(val) is str:
+                text = val.strip()
+                if text:
+                    return text
+
+        # Depth-first over nested data/list nodes, in the same order a recursive walk would take.
+        stack = [payload]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                text = node.strip()
+                if text:
+                    return text
+                continue
 
-        if isinstance(payload, list):
-            for item in payload:
-                t = BackboardClient._extract_assistant_text(item)
-                if t:
-                    return t
+            if isinstance(node, dict):
+                # Strip each candidate once and return that same string.
+                for key in _ASSISTANT_TEXT_KEYS:
+                    val = node.get(key)
+                    if isinstance(val, dict):
+                        val = val.get("content") or val.get("text")
+                    if isinstance(val, str):
+                        text = val.strip()
+                        if text:
+                            return text
+
+                msgs = node.get("messages")
+                if isinstance(msgs, list):
+                    for m in msgs:
+                        if isinstance(m, dict) and m.get("role") == "assistant":
+                            c = m.get("content") or m.get("text")
+                            if isinstance(c, str):
+                                text = c.strip()
+                                if text:
+                                    return text
+
+                data = node.get("data")
+                if isinstance(data, dict):
+                    stack.append(data)
+            elif isinstance(node, list):
+                stack.extend(reversed(node))
         return None
 
     async def extract_assistant_text(self, payload: Any) -> Optional[str]:
@@ -114,12 +477,11 @@ class BackboardClient:
     async def create_assistant(self, name: str) -> str:
         payload = {"name": name, "display_name": name}
         paths = ["assistants", "v1/assistants", "api/v1/assistants", "api/assistants"]
-        resp = await self._request_with_fallback("POST", paths, json_payload=payload)
+        resp = await self._request_with_fallback("POST", paths, cache_key="create_assistant", json_payload=payload)
 
-        if isinstance(resp, dict):
-            assistant_id = resp.get("id") or resp.get("assistant_id") or resp.get("assistantId") or resp.get("data", {}).get("id")
-            if assistant_id:
-                return str(assistant_id)
+        assistant_id = _extract_id(resp, _ASSISTANT_ID_KEYS)
+        if assistant_id:
+            return assistant_id
 
         raise HTTPException(status_code=502, detail="Backboard did not return an assistant_id")
 
@@ -132,12 +494,11 @@ class BackboardClient:
             "threads",
             "v1/threads",
         ]
-        resp = await self._request_with_fallback("POST", paths, json_payload=payload)
+        resp = await self._request_with_fallback("POST", paths, cache_key="create_thread", json_payload=payload)
 
-        if isinstance(resp, dict):
-            thread_id = resp.get("id") or resp.get("thread_id") or resp.get("threadId") or resp.get("data", {}).get("id")
-            if thread_id:
-                return str(thread_id)
+        thread_id = _extract_id(resp, _THREAD_ID_KEYS)
+        if thread_id:
+            return thread_id
 
         raise HTTPException(status_code=502, detail="Backboard did not return a thread_id")
 
@@ -158,19 +519,15 @@ class BackboardClient:
             "send_to_llm": send_to_llm,
             "memory": memory,
         }
-        paths = [
-            f"threads/{thread_id}/messages",
-            f"v1/threads/{thread_id}/messages",
-            f"api/v1/threads/{thread_id}/messages",
-            f"assistants/{assistant_id}/threads/{thread_id}/messages" if assistant_id else None,
-            f"api/assistants/{assistant_id}/threads/{thread_id}/messages" if assistant_id else None,
-            f"v1/assistants/{assistant_id}/threads/{thread_id}/messages" if assistant_id else None,
-            f"api/v1/assistants/{assistant_id}/threads/{thread_id}/messages" if assistant_id else None,
-            "messages",
-            "v1/messages",
-            "api/v1/messages",
-        ]
-        return await self._request_with_fallback("POST", [p for p in paths if p], data_payload=payload)
+        templates = _MESSAGE_PATHS if assistant_id else _MESSAGE_PATHS_NO_ASSISTANT
+        paths = tuple(t.format(tid=thread_id, aid=assistant_id) for t in templates)
+        return await self._request_with_fallback(
+            "POST",
+            paths,
+            # The candidate list is shorter without an assistant_id, so cache it separately.
+            cache_key="send_message" if assistant_id else "send_message_no_assistant",
+            data_payload=payload,
+        )
 
     # ---- Memories API ----
 
@@ -190,87 +547,110 @@ class BackboardClient:
             f"api/v1/assistants/{assistant_id}/memories",
             f"api/assistants/{assistant_id}/memories",
         ]
-        return await self._request_with_fallback("POST", paths, json_payload=payload)
+        resp = await self._request_with_fallback("POST", paths, cache_key="add_memory", json_payload=payload)
+        self._invalidate_memories(assistant_id)
+        return resp
+
+    def _invalidate_memories(self, assistant_id: str) -> None:
+        # Stamps come from one counter, so an evicted stamp reads as 0, which no in-flight read that
+        # saw a real stamp will match.
+        self._generation.set(assistant_id, next(self._generation_counter))
+        self._mem_cache.pop(assistant_id, None)
+        self._query_cache.pop(assistant_id, None)
+        for key in [k for k in self._query_inflight if k[0] == assistant_id]:
+            del self._query_inflight[key]
 
     @staticmethod
     def _normalize_memories_payload(payload: Any) -> List[Dict[str, Any]]:
-        def wrap_item(x: Any) -> Optional[Dict[str, Any]]:
-            if isinstance(x, dict):
-                content = x.get("content") or x.get("memory") or x.get("text")
-                if isinstance(content, str) and content.strip():
-                    extra = {k: v for k, v in x.items() if k not in ("content", "memory", "text")}
-                    return {"memory": content.strip(), **extra}
-                return None
-            if isinstance(x, str) and x.strip():
-                return {"memory": x.strip()}
-            return None
-
         if payload is None:
             return []
 
         if isinstance(payload, list):
-            out: List[Dict[str, Any]] = []
-            for item in payload:
-                w = wrap_item(item)
-                if w:
-                    out.append(w)
-            return out
-
-        if isinstance(payload, dict):
-            if isinstance(payload.get("memories"), list):
-                return [w for w in (wrap_item(i) for i in payload["memories"]) if w]
+            items: Any = payload
+        elif isinstance(payload, dict):
             data = payload.get("data")
-            if isinstance(data, dict) and isinstance(data.get("memories"), list):
-                return [w for w in (wrap_item(i) for i in data["memories"]) if w]
-            if isinstance(payload.get("items"), list):
-                return [w for w in (wrap_item(i) for i in payload["items"]) if w]
-            if isinstance(payload.get("results"), list):
-                return [w for w in (wrap_item(i) for i in payload["results"]) if w]
-        return []
+            if isinstance(payload.get("memories"), list):
+                items = payload["memories"]
+            elif isinstance(data, dict) and isinstance(data.get("memories"), list):
+                items = data["memories"]
+            elif isinstance(payload.get("items"), list):
+                items = payload["items"]
+            elif isinstance(payload.get("results"), list):
+                items = payload["results"]
+            else:
+                return []
+        else:
+            return []
+
+        return [w for w in map(_wrap_memory_item, items) if w]
+
+    @staticmethod
+    def _index_memories(memories: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        # Bucket by the lowercased tag family before the first underscore ("tp" for TP_*),
+        # keeping listing order inside each bucket; untagged memories land under "".
+        buckets: Dict[str, List[Dict[str, Any]]] = {}
+        for m in memories:
+            head, sep, _ = (m.get("memory") or "").lstrip()[:16].partition("_")
+            buckets.setdefault(head.lower() if sep else "", []).append(m)
+        return buckets
 
     async def list_memories(self, *, assistant_id: str) -> List[Dict[str, Any]]:
+        return list((await self._list_memories_indexed(assistant_id)).memories)
+
+    async def _list_memories_indexed(self, assistant_id: str) -> _MemoryListing:
         paths = [
             f"assistants/{assistant_id}/memories",
             f"v1/assistants/{assistant_id}/memories",
             f"api/v1/assistants/{assistant_id}/memories",
             f"api/assistants/{assistant_id}/memories",
         ]
-        resp = await self._request_with_fallback("GET", paths)
-        return self._normalize_memories_payload(resp)
 
-    @staticmethod
-    def extract_retrieved_memories(payload: Any) -> List[Dict[str, Any]]:
-        def norm_list(lst: Any) -> List[Dict[str, Any]]:
-            if not isinstance(lst, list):
-                return []
-            out = []
-            for x in lst:
-                if isinstance(x, dict):
-                    out.append(x)
-                elif isinstance(x, str) and x.strip():
-                    out.append({"memory": x.strip()})
-            return out
+        # Revalidate a recent listing with ETag / Last-Modified instead of re-downloading it.
+        now = time.monotonic()
+        cached = self._mem_cache.get(assistant_id)
+        conditional: Optional[Dict[str, str]] = None
+        if cached and cached.expires_at > now:
+            conditional = {cached.validator[0]: cached.validator[1]}
+        else:
+            self._mem_cache.pop(assistant_id, None)
+            cached = None
+
+        generation = self._generation.get(assistant_id, 0)
+        resp = await self._send_with_fallback("GET", paths, cache_key="list_memories", extra_headers=conditional)
+        fresh = self._generation.get(assistant_id, 0) == generation
+        if resp.status_code == 304 and cached:
+            cached = cached._replace(expires_at=now + _MEMORY_CACHE_TTL)
+            if fresh:
+                self._mem_cache[assistant_id] = cached
+            return cached
 
-        if payload is None:
-            return []
-
-        if isinstance(payload, dict):
-            for key in ("retrieved_memories", "retrievedMemories", "memory_hits", "retrievals", "results"):
-                n = norm_list(payload.get(key))
-                if n:
-                    return n
-            for key in ("data", "message", "response", "raw_response", "run", "output"):
-                nested = payload.get(key)
-                out = BackboardClient.extract_retrieved_memories(nested)
-                if out:
-                    return out
-
-        if isinstance(payload, list):
-            for item in payload:
-                out = BackboardClient.extract_retrieved_memories(item)
-                if out:
-                    return out
+        try:
+            memories = self._normalize_memories_payload(serialization.loads(resp.content))
+        except ValueError:
+            raise HTTPException(status_code=502, detail="Backboard returned non-JSON response")
+
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        validator = ("If-None-Match", etag) if etag else ("If-Modified-Since", last_modified or "")
+        listing = _MemoryListing(validator, now + _MEMORY_CACHE_TTL, memories, self._index_memories(memories))
+        if (etag or last_modified) and fresh:
+            self._mem_cache[assistant_id] = listing
+        return listing
 
+    @staticmethod
+    def extract_retrieved_memories(payload: Any) -> List[Dict[str, Any]]:
+        # Depth-first, first non-empty hit wins (same order as a recursive walk).
+        stack = [payload]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                for key in _RETRIEVAL_KEYS:
+                    n = _norm_memory_list(node.get(key))
+                    if n:
+                        return n
+                stack.extend(node.get(key) for key in reversed(_RETRIEVAL_NESTED_KEYS))
+            elif isinstance(node, list):
+                stack.extend(reversed(node))
         return []
 
     async def query_memories(
@@ -281,12 +661,55 @@ class BackboardClient:
         query: str,
         top_k: int = 20,
     ) -> List[Dict[str, Any]]:
+        per_assistant = self._query_cache.get(assistant_id)
+        cached = per_assistant.get((query, top_k)) if per_assistant is not None else None
+        if cached is not None:
+            return list(cached)
+
+        # Concurrent callers asking the same thing share one Backboard round trip.
+        key = (assistant_id, thread_id, query, top_k)
+        generation = self._generation.get(assistant_id, 0)
+        task = self._query_inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._query_memories_uncached(thread_id=thread_id, assistant_id=assistant_id, query=query, top_k=top_k)
+            )
+            self._query_inflight[key] = task
+            task.add_done_callback(lambda t: self._drop_inflight(key, t))
+        mems = await asyncio.shield(task)
+
+        # A memory added while this was in flight makes the result stale; return it, don't cache it.
+        if self._generation.get(assistant_id, 0) != generation:
+            return list(mems)
+        per_assistant = self._query_cache.get(assistant_id)
+        if per_assistant is None:
+            per_assistant = TTLCache(maxsize=_QUERY_CACHE_MAX_PER_ASSISTANT, ttl=_QUERY_CACHE_TTL)
+            self._query_cache.set(assistant_id, per_assistant)
+        per_assistant.set((query, top_k), mems)
+        return list(mems)
+
+    def _drop_inflight(self, key: Tuple[str, str, str, int], task: "asyncio.Future[List[Dict[str, Any]]]") -> None:
+        # Only forget the entry if it still points at this task; an invalidation may have replaced it.
+        if self._query_inflight.get(key) is task:
+            del self._query_inflight[key]
+
+    async def _query_memories_uncached(
+        self,
+        *,
+        thread_id: str,
+        assistant_id: str,
+        query: str,
+        top_k: int,
+    ) -> List[Dict[str, Any]]:
+        # A fresh listing that already has TP_* memories answers the lookup without an LLM call.
+        listing = self._mem_cache.get(assistant_id)
+        if listing and listing.expires_at > time.monotonic():
+            tp = listing.buckets.get(_TP_BUCKET)
+            if tp:
+                return tp[:top_k]
+
         # Try retrieval via tiny LLM call
-        prompt = (
-            "Memory lookup. Reply only with 'OK'.\n"
-            f"Query: {query}\n"
-            "Do not store this message as a user memory."
-        )
+        prompt = _MEM_LOOKUP_PREFIX + query + _MEM_LOOKUP_SUFFIX
         payload = None
         try:
             payload = await self.send_message(
@@ -310,16 +733,14 @@ class BackboardClient:
 
         mems = self.extract_retrieved_memories(payload)
 
-        # Fallback: list memories explicitly
-        if not mems:
-            mems = await self.list_memories(assistant_id=assistant_id)
-
-        # Prefer TP_* memories
-        tp = []
-        for m in mems:
-            s = (m.get("memory") or "").strip().lower()
-            if s.startswith("tp_"):
-                tp.append(m)
-        mems = tp or mems
+        if mems:
+            # Prefer TP_* memories. Only the prefix is lowercased, not the whole (possibly KB-sized) memory.
+            n = len(_TP_PREFIX)
+            tp = [m for m in mems if (m.get("memory") or "").lstrip()[:n].lower() == _TP_PREFIX]
+            mems = tp or mems
+        else:
+            # Fallback: list memories explicitly; the listing is already bucketed by tag family.
+            listing = await self._list_memories_indexed(assistant_id)
+            mems = listing.buckets.get(_TP_BUCKET) or listing.memories
 
         return mems[:top_k]
@@ -0,0 +1,34 @@
+# backend/config.py
+# Environment configuration, read once at import. Every backend module takes its settings from
+# here so the repo-root .env is loaded before anything reads os.environ.
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
+
+
+def _env_int(name: str, default: int) -> int:
+    # A malformed value falls back to the default instead of failing startup.
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+DB_PATH = Path(os.getenv("DB_PATH", "/tmp/sessions.db"))
+
+DEFAULT_API_BASE_URL = "https://app.backboard.io/api"
+API_BASE_URL = os.getenv("API_BASE_URL", DEFAULT_API_BASE_URL)
+BACKBOARD_API_KEY = os.getenv("BACKBOARD_API_KEY")
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5.2")  # pick what you want
+
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*")
+
+# Audit volume controls: keep every Nth chat turn (1 = all), and store raw responses larger than
+# AUDIT_MAX_BYTES as a size marker instead of the full body (0 = no cap).
+AUDIT_SAMPLE_RATE = max(1, _env_int("AUDIT_SAMPLE_RATE", 1))
+AUDIT_MAX_BYTES = _env_int("AUDIT_MAX_BYTES", 32768)
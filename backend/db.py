@@ -1,20 +1,49 @@
-import os
+import asyncio
+import logging
+import queue
 import sqlite3
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone
-from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.config import DB_PATH
+
+logger = logging.getLogger(__name__)
 
-DB_PATH = Path(os.getenv("DB_PATH", "/tmp/sessions.db"))
 _DB_INITIALIZED = False
 
+# Set for the duration of a transaction() so every row it writes shares one timestamp.
+_TX_TIMESTAMP: ContextVar[Optional[str]] = ContextVar("_TX_TIMESTAMP", default=None)
+
+# Per-connection tuning. WAL + synchronous=NORMAL drops the fsync on every commit and lets
+# readers run alongside the writer. Busy waiting comes from sqlite3.connect(timeout=30).
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def _apply_pragmas(conn: sqlite3.Connection) -> None:
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
 
 def _now_iso() -> str:
+    ts = _TX_TIMESTAMP.get()
+    if ts is not None:
+        return ts
     return datetime.now(timezone.utc).isoformat()
 
 
 def init_db() -> None:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(str(DB_PATH))
+    conn.execute("PRAGMA journal_mode=WAL")  # persistent: stored in the database file
+    _apply_pragmas(conn)
 
     conn.execute(
         """
@@ -99,6 +128,12 @@ def init_db() -> None:
         """
     )
 
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_session_id ON cards(session_id, id DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_challenges_session_cid ON challenges(session_id, challenge_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_session ON payment_attempts(session_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_card ON payment_attempts(card_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_session_ts ON audit_log(session_id, timestamp)")
+
     conn.commit()
     conn.close()
 
@@ -112,12 +147,119 @@ def _ensure_db() -> None:
 
 def get_connection() -> sqlite3.Connection:
     _ensure_db()
-    return sqlite3.connect(str(DB_PATH), timeout=30, check_same_thread=False)
+    conn = sqlite3.connect(str(DB_PATH), timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    _apply_pragmas(conn)
+    return conn
+
+
+# Statements used by the helpers below; one shared string per statement.
+_SQL_GET_SESSION = "SELECT session_id, assistant_id, thread_id FROM sessions WHERE session_id = ?"
+_SQL_UPSERT_SESSION = """
+INSERT INTO sessions (session_id, assistant_id, thread_id, created_at)
+VALUES (?, ?, ?, ?)
+ON CONFLICT(session_id) DO UPDATE SET
+    assistant_id=excluded.assistant_id,
+    thread_id=excluded.thread_id,
+    created_at=excluded.created_at
+"""
+_SQL_INSERT_AUDIT = """
+INSERT INTO audit_log (session_id, timestamp, user_prompt, assistant_text, raw_json)
+VALUES (?, ?, ?, ?, ?)
+"""
+_SQL_INSERT_CARD = """
+INSERT INTO cards (session_id, nickname, network, last4, exp_month, exp_year, billing_country, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_LIST_CARDS = """
+SELECT id, nickname, network, last4, exp_month, exp_year, billing_country, created_at
+FROM cards WHERE session_id = ? ORDER BY id DESC
+"""
+_SQL_GET_CARD = """
+SELECT id, nickname, network, last4, exp_month, exp_year, billing_country, created_at
+FROM cards WHERE session_id = ? AND id = ?
+"""
+_SQL_INSERT_PAYMENT_ATTEMPT = """
+INSERT INTO payment_attempts
+(session_id, card_id, merchant, amount, currency, country, channel, item_description, dcc_offered,
+ decision, challenge_method, risk_score, status, challenge_id, created_at, raw_json)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_SQL_INSERT_CHALLENGE = """
+INSERT INTO challenges (challenge_id, session_id, method, status, created_at, resolved_at)
+VALUES (?, ?, ?, ?, ?, NULL)
+"""
+_SQL_RESOLVE_CHALLENGE = """
+UPDATE challenges
+SET status = ?, resolved_at = ?
+WHERE challenge_id = ? AND session_id = ?
+"""
+_SQL_GET_CHALLENGE = """
+SELECT challenge_id, method, status, created_at, resolved_at
+FROM challenges WHERE session_id = ? AND challenge_id = ?
+"""
+
+
+# Idle connections kept open for reuse, so each caller skips connect + pragma setup.
+_POOL_SIZE = 8
+_CONN_POOL: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+
+
+def lease_pooled() -> Optional[sqlite3.Connection]:
+    # Pool hit only (non-blocking); None means the caller has to open a connection.
+    try:
+        return _CONN_POOL.get_nowait()
+    except queue.Empty:
+        return None
+
+
+def return_to_pool(conn: sqlite3.Connection) -> bool:
+    # False when the pool is full; the caller then closes the connection.
+    if conn.in_transaction:
+        conn.rollback()
+    if _CONN_POOL.qsize() < _POOL_SIZE:
+        _CONN_POOL.put(conn)
+        return True
+    return False
+
+
+def acquire_connection() -> sqlite3.Connection:
+    conn = lease_pooled()
+    return conn if conn is not None else get_connection()
+
+
+def release_connection(conn: sqlite3.Connection) -> None:
+    if not return_to_pool(conn):
+        conn.close()
+
+
+def warm_pool(size: int = 2) -> None:
+    # Open a few connections up front so the first requests skip connect + pragma setup.
+    for _ in range(min(size, _POOL_SIZE) - _CONN_POOL.qsize()):
+        _CONN_POOL.put(get_connection())
+
+
+def close_pool() -> None:
+    while True:
+        try:
+            conn = _CONN_POOL.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+
+
+@contextmanager
+def pooled_connection() -> Iterator[sqlite3.Connection]:
+    conn = acquire_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
 
 
 def get_session(conn: sqlite3.Connection, session_id: str) -> Optional[Dict[str, str]]:
     cur = conn.execute(
-        "SELECT session_id, assistant_id, thread_id FROM sessions WHERE session_id = ?",
+        _SQL_GET_SESSION,
         (session_id,),
     )
     row = cur.fetchone()
@@ -128,68 +270,142 @@ def get_session(conn: sqlite3.Connection, session_id: str) -> Optional[Dict[str,
 
 def upsert_session(conn: sqlite3.Connection, session_id: str, assistant_id: str, thread_id: str, created_at: str) -> None:
     conn.execute(
-        """
-        INSERT INTO sessions (session_id, assistant_id, thread_id, created_at)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(session_id) DO UPDATE SET
-            assistant_id=excluded.assistant_id,
-            thread_id=excluded.thread_id,
-            created_at=excluded.created_at
-        """,
+        _SQL_UPSERT_SESSION,
         (session_id, assistant_id, thread_id, created_at),
     )
-    conn.commit()
 
 
 def insert_audit(conn: sqlite3.Connection, session_id: str, timestamp: str, user_prompt: str, assistant_text: str, raw_json: str) -> None:
     conn.execute(
-        """
-        INSERT INTO audit_log (session_id, timestamp, user_prompt, assistant_text, raw_json)
-        VALUES (?, ?, ?, ?, ?)
-        """,
+        _SQL_INSERT_AUDIT,
         (session_id, timestamp, user_prompt, assistant_text, raw_json),
     )
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    # Mutators below don't commit; wrap a request's writes in one of these so they share a
+    # single commit. Nested use joins the outer transaction.
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    token = _TX_TIMESTAMP.set(datetime.now(timezone.utc).isoformat())
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _TX_TIMESTAMP.reset(token)
     conn.commit()
 
 
-def add_audit_log(*, conn: sqlite3.Connection, session_id: str, user_prompt: str, assistant_text: Optional[str], raw_response_json: str) -> None:
-    insert_audit(
-        conn=conn,
-        session_id=session_id,
-        timestamp=_now_iso(),
-        user_prompt=user_prompt,
-        assistant_text=assistant_text or "",
-        raw_json=raw_response_json,
-    )
+# Audit rows are handed to a background writer when one is running, which inserts them in
+# batches with a single commit instead of one commit per row on the request path.
+_AUDIT_BATCH_SIZE = 50
+_AUDIT_FLUSH_INTERVAL = 0.05
+_AUDIT_QUEUE: "Optional[asyncio.Queue[Optional[Tuple[str, str, str, str, str]]]]" = None
+_AUDIT_TASK: "Optional[asyncio.Task[None]]" = None
 
 
-def create_session(*args) -> None:
-    if len(args) >= 1 and isinstance(args[0], sqlite3.Connection):
-        conn = args[0]
-        rest = args[1:]
-        if len(rest) == 3:
-            session_id, assistant_id, thread_id = rest
-            created_at = _now_iso()
-        elif len(rest) == 4:
-            session_id, assistant_id, thread_id, created_at = rest
-        else:
-            raise TypeError("create_session(conn, ...) expects (conn, session_id, assistant_id, thread_id[, created_at])")
-        upsert_session(conn, session_id, assistant_id, thread_id, created_at)
+def _insert_audit_batch(rows: List[Tuple[str, str, str, str, str]]) -> None:
+    with pooled_connection() as conn, transaction(conn):
+        conn.executemany(
+            _SQL_INSERT_AUDIT,
+            rows,
+        )
+
+
+async def _audit_writer(q: "asyncio.Queue[Optional[Tuple[str, str, str, str, str]]]") -> None:
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        row = await q.get()
+        if row is None:
+            break
+        batch = [row]
+        deadline = loop.time() + _AUDIT_FLUSH_INTERVAL
+        while len(batch) < _AUDIT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                row = await asyncio.wait_for(q.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if row is None:
+                stopping = True
+                break
+            batch.append(row)
+        try:
+            await asyncio.to_thread(_insert_audit_batch, batch)
+        except Exception:
+            # Audit logging is best-effort, but the writer must outlive a bad batch.
+            logger.exception("Dropped %d audit rows", len(batch))
+
+
+def start_audit_writer() -> None:
+    global _AUDIT_QUEUE, _AUDIT_TASK
+    if _AUDIT_TASK is not None:
+        return
+    _AUDIT_QUEUE = asyncio.Queue()
+    _AUDIT_TASK = asyncio.create_task(_audit_writer(_AUDIT_QUEUE))
+
+
+async def stop_audit_writer() -> None:
+    global _AUDIT_QUEUE, _AUDIT_TASK
+    if _AUDIT_TASK is None or _AUDIT_QUEUE is None:
         return
+    _AUDIT_QUEUE.put_nowait(None)
+    await _AUDIT_TASK
+    _AUDIT_QUEUE = None
+    _AUDIT_TASK = None
+
 
-    if len(args) == 3:
-        session_id, assistant_id, thread_id = args
+def add_audit_log(*, conn: sqlite3.Connection, session_id: str, user_prompt: str, assistant_text: Optional[str], raw_response_json: str) -> None:
+    if _AUDIT_QUEUE is not None and _AUDIT_TASK is not None and not _AUDIT_TASK.done():
+        _AUDIT_QUEUE.put_nowait((session_id, _now_iso(), user_prompt, assistant_text or "", raw_response_json))
+        return
+    with transaction(conn):
+        insert_audit(
+            conn=conn,
+            session_id=session_id,
+            timestamp=_now_iso(),
+            user_prompt=user_prompt,
+            assistant_text=assistant_text or "",
+            raw_json=raw_response_json,
+        )
+
+
+def _create_session_on(conn: sqlite3.Connection, session_id: str, assistant_id: str, thread_id: str, created_at: Optional[str] = None) -> None:
+    if created_at is None:
         created_at = _now_iso()
-    elif len(args) == 4:
-        session_id, assistant_id, thread_id, created_at = args
-    else:
-        raise TypeError("create_session expects (session_id, assistant_id, thread_id[, created_at])")
+    upsert_session(conn, session_id, assistant_id, thread_id, created_at)
 
-    conn = get_connection()
-    try:
-        upsert_session(conn, session_id, assistant_id, thread_id, created_at)
-    finally:
-        conn.close()
+
+def _create_session_pooled(session_id: str, assistant_id: str, thread_id: str, created_at: Optional[str] = None) -> None:
+    with pooled_connection() as conn, transaction(conn):
+        _create_session_on(conn, session_id, assistant_id, thread_id, created_at)
+
+
+# (first arg is a connection, arg count) -> implementation
+_CREATE_SESSION_DISPATCH = {
+    (True, 4): _create_session_on,
+    (True, 5): _create_session_on,
+    (False, 3): _create_session_pooled,
+    (False, 4): _create_session_pooled,
+}
+
+
+def create_session(*args) -> None:
+    has_conn = bool(args) and isinstance(args[0], sqlite3.Connection)
+    impl = _CREATE_SESSION_DISPATCH.get((has_conn, len(args)))
+    if impl is None:
+        if has_conn:
+            raise TypeError("create_session(conn, ...) expects (conn, session_id, assistant_id, thread_id[, created_at])")
+        raise TypeError("create_session expects (session_id, assistant_id, thread_id[, created_at])")
+    impl(*args)
 
 
 def add_card(
@@ -204,61 +420,29 @@ def add_card(
     billing_country: Optional[str],
 ) -> int:
     cur = conn.execute(
-        """
-        INSERT INTO cards (session_id, nickname, network, last4, exp_month, exp_year, billing_country, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+        _SQL_INSERT_CARD,
         (session_id, nickname, network, last4, exp_month, exp_year, billing_country, _now_iso()),
     )
-    conn.commit()
     return int(cur.lastrowid)
 
 
 def list_cards(conn: sqlite3.Connection, *, session_id: str) -> List[Dict[str, Any]]:
     cur = conn.execute(
-        """
-        SELECT id, nickname, network, last4, exp_month, exp_year, billing_country, created_at
-        FROM cards WHERE session_id = ? ORDER BY id DESC
-        """,
+        _SQL_LIST_CARDS,
         (session_id,),
     )
-    rows = cur.fetchall()
-    return [
-        {
-            "id": r[0],
-            "nickname": r[1],
-            "network": r[2],
-            "last4": r[3],
-            "exp_month": r[4],
-            "exp_year": r[5],
-            "billing_country": r[6],
-            "created_at": r[7],
-        }
-        for r in rows
-    ]
+    return [dict(r) for r in cur.fetchall()]
 
 
 def get_card(conn: sqlite3.Connection, *, session_id: str, card_id: int) -> Optional[Dict[str, Any]]:
     cur = conn.execute(
-        """
-        SELECT id, nickname, network, last4, exp_month, exp_year, billing_country, created_at
-        FROM cards WHERE session_id = ? AND id = ?
-        """,
+        _SQL_GET_CARD,
         (session_id, card_id),
     )
     r = cur.fetchone()
     if not r:
         return None
-    return {
-        "id": r[0],
-        "nickname": r[1],
-        "network": r[2],
-        "last4": r[3],
-        "exp_month": r[4],
-        "exp_year": r[5],
-        "billing_country": r[6],
-        "created_at": r[7],
-    }
+    return dict(r)
 
 
 def insert_payment_attempt(
@@ -281,12 +465,7 @@ def insert_payment_attempt(
     raw_json: str,
 ) -> int:
     cur = conn.execute(
-        """
-        INSERT INTO payment_attempts
-        (session_id, card_id, merchant, amount, currency, country, channel, item_description, dcc_offered,
-         decision, challenge_method, risk_score, status, challenge_id, created_at, raw_json)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
+        _SQL_INSERT_PAYMENT_ATTEMPT,
         (
             session_id,
             card_id,
@@ -306,39 +485,26 @@ def insert_payment_attempt(
             raw_json,
         ),
     )
-    conn.commit()
     return int(cur.lastrowid)
 
 
 def create_challenge(conn: sqlite3.Connection, *, challenge_id: str, session_id: str, method: str, status: str) -> None:
     conn.execute(
-        """
-        INSERT INTO challenges (challenge_id, session_id, method, status, created_at, resolved_at)
-        VALUES (?, ?, ?, ?, ?, NULL)
-        """,
+        _SQL_INSERT_CHALLENGE,
         (challenge_id, session_id, method, status, _now_iso()),
     )
-    conn.commit()
 
 
 def resolve_challenge(conn: sqlite3.Connection, *, challenge_id: str, session_id: str, status: str) -> None:
     conn.execute(
-        """
-        UPDATE challenges
-        SET status = ?, resolved_at = ?
-        WHERE challenge_id = ? AND session_id = ?
-        """,
+        _SQL_RESOLVE_CHALLENGE,
         (status, _now_iso(), challenge_id, session_id),
     )
-    conn.commit()
 
 
 def get_challenge(conn: sqlite3.Connection, *, session_id: str, challenge_id: str) -> Optional[Dict[str, Any]]:
     cur = conn.execute(
-        """
-        SELECT challenge_id, method, status, created_at, resolved_at
-        FROM challenges WHERE session_id = ? AND challenge_id = ?
-        """,
+        _SQL_GET_CHALLENGE,
         (session_id, challenge_id),
     )
     r = cur.fetchone()
@@ -1,30 +1,37 @@
 # backend/main.py
-import json
-import os
+import asyncio
+import itertools
 import uuid
 from datetime import datetime, timezone
-from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel, Field
 
-from backend import db
-from backend.backboard import BackboardClient, DEFAULT_API_BASE_URL
-from backend.risk import Purchase, extract_personalization, score_purchase
-
-# Load env from repo root .env
-load_dotenv(dotenv_path=Path(__file__).resolve().parents[1] / ".env")
+from backend import db, merchant_intel, serialization
+from backend.cache import TTLCache
+from backend.backboard import BackboardClient
+from backend.config import (
+    API_BASE_URL,
+    AUDIT_MAX_BYTES,
+    AUDIT_SAMPLE_RATE,
+    BACKBOARD_API_KEY,
+    CORS_ORIGINS,
+)
+from backend.risk import Personalization, Purchase, extract_personalization, score_purchase
 
-API_BASE_URL = os.getenv("API_BASE_URL", DEFAULT_API_BASE_URL)
-BACKBOARD_API_KEY = os.getenv("BACKBOARD_API_KEY")
+_audit_counter = itertools.count()
 
-CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*")
 _origins = ["*"] if CORS_ORIGINS.strip() == "*" else [o.strip() for o in CORS_ORIGINS.split(",") if o.strip()]
 
-app = FastAPI(title="TravelProof Backend")
+# orjson renders response bodies much faster than the stdlib encoder; it's optional, like in serialization.
+app = FastAPI(
+    title="TravelProof Backend",
+    default_response_class=ORJSONResponse if serialization.orjson is not None else JSONResponse,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=_origins,
@@ -176,12 +183,18 @@ class ChallengeVerifyResponse(BaseModel):
 # Helpers
 # -------------------------
 
-def get_db_conn():
-    conn = db.get_connection()
+async def get_db_conn():
+    # A pool hit is a non-blocking queue pop/put, so it stays on the event loop instead of taking
+    # a threadpool slot per request. Opening a connection on a miss (init, connect, PRAGMAs) and
+    # closing one when the pool is full do file I/O, so those run in a thread.
+    conn = db.lease_pooled()
+    if conn is None:
+        conn = await asyncio.to_thread(db.get_connection)
     try:
         yield conn
     finally:
-        conn.close()
+        if not db.return_to_pool(conn):
+            await asyncio.to_thread(conn.close)
 
 
 def _utc_now_iso() -> str:
@@ -189,8 +202,13 @@ def _utc_now_iso() -> str:
 
 
 def _safe_audit_log(*, conn, session_id: str, user_prompt: str, assistant_text: Optional[str], raw_response: Any) -> None:
+    if AUDIT_SAMPLE_RATE > 1 and next(_audit_counter) % AUDIT_SAMPLE_RATE:
+        return
     try:
-        raw_json = json.dumps(raw_response, default=str)
+        raw = serialization.dumps(raw_response, default=str)
+        if AUDIT_MAX_BYTES and len(raw) > AUDIT_MAX_BYTES:
+            raw = serialization.dumps({"_truncated": True, "size": len(raw)})
+        raw_json = raw.decode()
         if hasattr(db, "add_audit_log"):
             db.add_audit_log(
                 conn=conn,
@@ -201,14 +219,15 @@ def _safe_audit_log(*, conn, session_id: str, user_prompt: str, assistant_text:
             )
             return
         if hasattr(db, "insert_audit"):
-            db.insert_audit(
-                conn=conn,
-                session_id=session_id,
-                timestamp=_utc_now_iso(),
-                user_prompt=user_prompt,
-                assistant_text=assistant_text or "",
-                raw_json=raw_json,
-            )
+            with db.transaction(conn):
+                db.insert_audit(
+                    conn=conn,
+                    session_id=session_id,
+                    timestamp=_utc_now_iso(),
+                    user_prompt=user_prompt,
+                    assistant_text=assistant_text or "",
+                    raw_json=raw_json,
+                )
             return
     except Exception:
         pass
@@ -223,10 +242,20 @@ async def get_backboard_client(request: Request) -> BackboardClient:
     return client
 
 
+# Session rows don't change after creation, so lookups are cached for a while. Misses aren't
+# cached; a session may be created right after a 404.
+_SESSION_CACHE = TTLCache(maxsize=4096, ttl=300.0)  # session_id -> session row
+
+
 def _get_session_or_404(conn, session_id: str) -> Dict[str, str]:
+    cached = _SESSION_CACHE.get(session_id)
+    if cached is not None:
+        return cached
+
     s = db.get_session(conn, session_id)
     if not s:
         raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    _SESSION_CACHE.set(session_id, s)
     return s
 
 
@@ -237,13 +266,23 @@ def _get_session_or_404(conn, session_id: str) -> Dict[str, str]:
 @app.on_event("startup")
 async def startup_event() -> None:
     db.init_db()
+    db.warm_pool()
+    db.start_audit_writer()
     app.state.bb_client = BackboardClient(BACKBOARD_API_KEY, API_BASE_URL)
+    # Warm the Backboard connection in the background; startup doesn't wait on the network.
+    app.state.bb_warmup = asyncio.create_task(app.state.bb_client.warm()) if BACKBOARD_API_KEY else None
 
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
+    warmup: Optional[asyncio.Task] = app.state.bb_warmup
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
     client: BackboardClient = app.state.bb_client
     await client.aclose()
+    await merchant_intel.aclose()
+    await db.stop_audit_writer()
+    db.close_pool()
 
 
 # -------------------------
@@ -255,20 +294,49 @@ async def healthz() -> Dict[str, bool]:
     return {"ok": True}
 
 
+# Write blocks run via run_in_threadpool so a commit never stalls the event loop.
+def _persist_session(conn, session_id: str, assistant_id: str, thread_id: str) -> None:
+    _SESSION_CACHE.pop(session_id, None)
+    with db.transaction(conn):
+        if hasattr(db, "create_session"):
+            db.create_session(conn, session_id, assistant_id, thread_id)
+        else:
+            db.upsert_session(conn, session_id, assistant_id, thread_id, _utc_now_iso())
+
+
+def _with_pooled_connection(fn: Callable[[Any], None]) -> None:
+    # Background tasks run after the request's own connection has been released.
+    with db.pooled_connection() as conn:
+        fn(conn)
+
+
+def _ensure_demo_card(conn, session_id: str) -> None:
+    with db.transaction(conn):
+        cards = db.list_cards(conn, session_id=session_id)
+        if not cards:
+            db.add_card(
+                conn,
+                session_id=session_id,
+                nickname="Demo Visa",
+                network="VISA",
+                last4="4242",
+                exp_month=12,
+                exp_year=2030,
+                billing_country="CA",
+            )
+
+
 @app.post("/sessions", response_model=SessionResponse, status_code=201)
 async def create_session(
     client: BackboardClient = Depends(get_backboard_client),
     conn=Depends(get_db_conn),
 ) -> SessionResponse:
-    session_id = str(uuid.uuid4())
+    session_id = uuid.uuid4().hex
     assistant_id = await client.create_assistant(f"TravelProof {session_id}")
     thread_id = await client.create_thread(assistant_id)
 
     try:
-        if hasattr(db, "create_session"):
-            db.create_session(conn, session_id, assistant_id, thread_id)
-        else:
-            db.upsert_session(conn, session_id, assistant_id, thread_id, _utc_now_iso())
+        await run_in_threadpool(_persist_session, conn, session_id, assistant_id, thread_id)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to persist session: {exc}") from exc
 
@@ -329,6 +397,28 @@ async def chat(
 # Demo seed: Sweden + demo card
 # -------------------------
 
+_SWEDEN_SEED_MESSAGES: tuple[str, ...] = (
+    # Sweden travel mode
+    'TP_PROFILE {"current_country":"SE","trip_countries":["SE"],"sms_available":false,"preferred_verification":"PASSKEY","daily_budget":900}',
+    'TP_BASELINE {"typical_amount_min":50,"typical_amount_max":600}',
+
+    # Trust tiers
+    "TP_TRUSTED_MERCHANT_HIGH ICA",
+    "TP_TRUSTED_MERCHANT_HIGH IKEA",
+    "TP_TRUSTED_MERCHANT_MED SJ",
+    "TP_TRUSTED_MERCHANT_MED H&M",
+    "TP_TRUSTED_MERCHANT_HIGH Systembolaget",
+
+    # Merchant facts with official sources
+    'TP_MERCHANT_FACTS {"merchant":"ICA","category":"GROCERY","home_country":"SE","restricted":false,"source_url":"https://www.icagruppen.se/en/about-ica-gruppen/our-business/our-companies/ica-sweden/"}',
+    'TP_MERCHANT_FACTS {"merchant":"Systembolaget","category":"ALCOHOL","home_country":"SE","restricted":true,"source_url":"https://www.omsystembolaget.se/english/systembolaget-explained/"}',
+    'TP_MERCHANT_FACTS {"merchant":"SJ","category":"TRANSIT","home_country":"SE","restricted":false,"source_url":"https://www.sj.se/en/about-sj"}',
+    'TP_MERCHANT_FACTS {"merchant":"H&M","category":"APPAREL","home_country":"SE","restricted":false,"source_url":"https://hmgroup.com/about-us/history/"}',
+    'TP_MERCHANT_FACTS {"merchant":"IKEA","category":"FURNITURE","home_country":"SE","restricted":false,"source_url":"https://www.ikea.com/global/en/our-business/how-we-work/story-of-ikea/"}',
+)
+_SWEDEN_SEED_METADATA = {"tp": "seed_sweden"}
+
+
 @app.post("/sessions/{session_id}/demo/seed-sweden", response_model=DemoSeedResponse)
 async def demo_seed_sweden(
     session_id: str,
@@ -337,78 +427,48 @@ async def demo_seed_sweden(
 ) -> DemoSeedResponse:
     session = _get_session_or_404(conn, session_id)
 
-    seed_messages = [
-        # Sweden travel mode
-        'TP_PROFILE {"current_country":"SE","trip_countries":["SE"],"sms_available":false,"preferred_verification":"PASSKEY","daily_budget":900}',
-        'TP_BASELINE {"typical_amount_min":50,"typical_amount_max":600}',
-
-        # Trust tiers
-        "TP_TRUSTED_MERCHANT_HIGH ICA",
-        "TP_TRUSTED_MERCHANT_HIGH IKEA",
-        "TP_TRUSTED_MERCHANT_MED SJ",
-        "TP_TRUSTED_MERCHANT_MED H&M",
-        "TP_TRUSTED_MERCHANT_HIGH Systembolaget",
-
-        # Merchant facts with official sources
-        'TP_MERCHANT_FACTS {"merchant":"ICA","category":"GROCERY","home_country":"SE","restricted":false,"source_url":"https://www.icagruppen.se/en/about-ica-gruppen/our-business/our-companies/ica-sweden/"}',
-        'TP_MERCHANT_FACTS {"merchant":"Systembolaget","category":"ALCOHOL","home_country":"SE","restricted":true,"source_url":"https://www.omsystembolaget.se/english/systembolaget-explained/"}',
-        'TP_MERCHANT_FACTS {"merchant":"SJ","category":"TRANSIT","home_country":"SE","restricted":false,"source_url":"https://www.sj.se/en/about-sj"}',
-        'TP_MERCHANT_FACTS {"merchant":"H&M","category":"APPAREL","home_country":"SE","restricted":false,"source_url":"https://hmgroup.com/about-us/history/"}',
-        'TP_MERCHANT_FACTS {"merchant":"IKEA","category":"FURNITURE","home_country":"SE","restricted":false,"source_url":"https://www.ikea.com/global/en/our-business/how-we-work/story-of-ikea/"}',
-    ]
-
-    for msg in seed_messages:
+    async def seed(msg: str) -> None:
         await client.add_memory(
             assistant_id=session["assistant_id"],
             content=msg,
-            metadata={"tp": "seed_sweden"},
+            metadata=_SWEDEN_SEED_METADATA,
         )
 
+    # The first write learns the working endpoint; the rest then go out concurrently.
+    await seed(_SWEDEN_SEED_MESSAGES[0])
+    await asyncio.gather(*(seed(msg) for msg in _SWEDEN_SEED_MESSAGES[1:]))
+
+    _PERSONALIZATION_CACHE.pop(session_id, None)
+
     # Auto-create demo card if none exists
-    cards = db.list_cards(conn, session_id=session_id)
-    if not cards:
-        db.add_card(
-            conn,
-            session_id=session_id,
-            nickname="Demo Visa",
-            network="VISA",
-            last4="4242",
-            exp_month=12,
-            exp_year=2030,
-            billing_country="CA",
-        )
+    await run_in_threadpool(_ensure_demo_card, conn, session_id)
 
     return DemoSeedResponse(ok=True)
 
 
 @app.get("/sessions/{session_id}/cards", response_model=CardsResponse)
-async def get_cards(session_id: str, conn=Depends(get_db_conn)) -> CardsResponse:
+def get_cards(session_id: str, conn=Depends(get_db_conn)) -> CardsResponse:
     _ = _get_session_or_404(conn, session_id)
     cards = db.list_cards(conn, session_id=session_id)
-    return CardsResponse(cards=[CardResponse(**c) for c in cards])
+    return CardsResponse.model_construct(cards=[CardResponse.model_construct(**c) for c in cards])
 
 
 # -------------------------
 # Risk dashboard
 # -------------------------
 
-@app.post("/sessions/{session_id}/purchase/preview", response_model=PurchasePreviewResponse)
-async def purchase_preview(
-    session_id: str,
-    payload: PurchasePreviewRequest,
-    client: BackboardClient = Depends(get_backboard_client),
-    conn=Depends(get_db_conn),
-) -> PurchasePreviewResponse:
-    session = _get_session_or_404(conn, session_id)
+# session_id -> (memory fingerprint, Personalization, UI dict)
+_PERSONALIZATION_CACHE = TTLCache(maxsize=1024)
 
-    retrieved = await client.query_memories(
-        thread_id=session["thread_id"],
-        assistant_id=session["assistant_id"],
-        query="Return TP_PROFILE / TP_BASELINE / TP_TRUSTED_MERCHANT_* / TP_MERCHANT_FACTS for TravelProof UI.",
-        top_k=80,
-    )
-    p = extract_personalization(retrieved)
 
+def _personalization_for(session_id: str, retrieved: list) -> Tuple[Personalization, Dict[str, Any]]:
+    # Reuse the parsed personalization while the retrieved memories are unchanged.
+    fingerprint = tuple(m.get("memory") for m in retrieved)
+    cached = _PERSONALIZATION_CACHE.get(session_id)
+    if cached and cached[0] == fingerprint:
+        return cached[1], cached[2]
+
+    p = extract_personalization(retrieved)
     personalization_ui = {
         "current_country": p.current_country,
         "trip_countries": p.trip_countries,
@@ -421,9 +481,13 @@ async def purchase_preview(
         "trusted_med": sorted(list(p.trusted_med)),
         "trusted_low": sorted(list(p.trusted_low)),
     }
+    _PERSONALIZATION_CACHE.set(session_id, (fingerprint, p, personalization_ui))
+    return p, personalization_ui
+
 
+def _score_store_risks(purchases: list[PurchaseAttemptRequest], p: Personalization) -> list[StoreRiskItem]:
     store_risks: list[StoreRiskItem] = []
-    for x in payload.purchases:
+    for x in purchases:
         result = score_purchase(
             Purchase(
                 merchant=x.merchant,
@@ -439,8 +503,10 @@ async def purchase_preview(
             trust_score=50,
         )
 
+        # Built from already-validated request fields and our own scorer output; the response
+        # model validates the whole payload once on the way out, so skip it per item here.
         store_risks.append(
-            StoreRiskItem(
+            StoreRiskItem.model_construct(
                 merchant=x.merchant,
                 amount=float(x.amount),
                 currency=x.currency,
@@ -458,11 +524,36 @@ async def purchase_preview(
                 user_message=result.user_message,
             )
         )
+    return store_risks
+
+
+@app.post("/sessions/{session_id}/purchase/preview", response_model=PurchasePreviewResponse)
+async def purchase_preview(
+    session_id: str,
+    payload: PurchasePreviewRequest,
+    include_memories: bool = True,
+    client: BackboardClient = Depends(get_backboard_client),
+    conn=Depends(get_db_conn),
+) -> PurchasePreviewResponse:
+    session = _get_session_or_404(conn, session_id)
 
-    return PurchasePreviewResponse(
+    retrieved = await client.query_memories(
+        thread_id=session["thread_id"],
+        assistant_id=session["assistant_id"],
+        query="Return TP_PROFILE / TP_BASELINE / TP_TRUSTED_MERCHANT_* / TP_MERCHANT_FACTS for TravelProof UI.",
+        top_k=80,
+    )
+    p, personalization_ui = _personalization_for(session_id, retrieved)
+
+    # Scoring is plain CPU work; one threadpool hop keeps large batches off the event loop.
+    store_risks = await run_in_threadpool(_score_store_risks, payload.purchases, p)
+
+    # response_model validates the payload on the way out; constructing it validated too would do it twice.
+    return PurchasePreviewResponse.model_construct(
         personalization=personalization_ui,
         store_risks=store_risks,
-        retrieved_memories=retrieved,
+        # Clients that don't show the raw memories can pass ?include_memories=false to skip echoing them.
+        retrieved_memories=retrieved if include_memories else None,
     )
 
 
@@ -474,12 +565,14 @@ async def purchase_preview(
 async def payment_authorize(
     session_id: str,
     payload: PaymentAuthorizeRequest,
+    background_tasks: BackgroundTasks,
+    include_memories: bool = True,
     client: BackboardClient = Depends(get_backboard_client),
     conn=Depends(get_db_conn),
 ) -> PaymentAuthorizeResponse:
-    session = _get_session_or_404(conn, session_id)
+    session = await run_in_threadpool(_get_session_or_404, conn, session_id)
 
-    card = db.get_card(conn, session_id=session_id, card_id=int(payload.card_id))
+    card = await run_in_threadpool(db.get_card, conn, session_id=session_id, card_id=int(payload.card_id))
     if not card:
         raise HTTPException(status_code=404, detail=f"Card {payload.card_id} not found for session")
 
@@ -489,7 +582,7 @@ async def payment_authorize(
         query="Return TP_PROFILE / TP_BASELINE / TP_TRUSTED_MERCHANT_* / TP_MERCHANT_FACTS for authorization.",
         top_k=80,
     )
-    p = extract_personalization(retrieved)
+    p, _ = _personalization_for(session_id, retrieved)
 
     result = score_purchase(
         Purchase(
@@ -511,17 +604,11 @@ async def payment_authorize(
         challenge_id = None
     else:
         status = "CHALLENGE_REQUIRED"
-        challenge_id = str(uuid.uuid4())
-        db.create_challenge(
-            conn,
-            challenge_id=challenge_id,
-            session_id=session_id,
-            method=result.challenge_method,
-            status="PENDING",
-        )
+        challenge_id = uuid.uuid4().hex
 
+    card_summary = {"id": card["id"], "nickname": card["nickname"], "network": card["network"], "last4": card["last4"]}
     raw = {
-        "card": {"id": card["id"], "network": card["network"], "last4": card["last4"], "nickname": card["nickname"]},
+        "card": card_summary,
         "purchase": payload.model_dump(),
         "risk": {
             "decision": result.decision,
@@ -537,26 +624,44 @@ async def payment_authorize(
         "challenge_id": challenge_id,
     }
 
-    db.insert_payment_attempt(
-        conn,
-        session_id=session_id,
-        card_id=int(payload.card_id),
-        merchant=payload.merchant,
-        amount=float(payload.amount),
-        currency=payload.currency,
-        country=payload.country,
-        channel=payload.channel,
-        item_description=payload.item_description,
-        dcc_offered=bool(payload.dcc_offered),
-        decision=result.decision,
-        challenge_method=result.challenge_method,
-        risk_score=result.risk_score,
-        status=status,
-        challenge_id=challenge_id,
-        raw_json=json.dumps(raw, default=str),
-    )
+    # Challenge row and payment attempt commit together
+    def record_attempt(conn) -> None:
+        with db.transaction(conn):
+            if challenge_id is not None:
+                db.create_challenge(
+                    conn,
+                    challenge_id=challenge_id,
+                    session_id=session_id,
+                    method=result.challenge_method,
+                    status="PENDING",
+                )
+            db.insert_payment_attempt(
+                conn,
+                session_id=session_id,
+                card_id=int(payload.card_id),
+                merchant=payload.merchant,
+                amount=float(payload.amount),
+                currency=payload.currency,
+                country=payload.country,
+                channel=payload.channel,
+                item_description=payload.item_description,
+                dcc_offered=bool(payload.dcc_offered),
+                decision=result.decision,
+                challenge_method=result.challenge_method,
+                risk_score=result.risk_score,
+                status=status,
+                challenge_id=challenge_id,
+                raw_json=serialization.dumps_str(raw, default=str),
+            )
+
+    if challenge_id is None:
+        # Nothing reads an approved attempt back, so it is written after the response is sent.
+        background_tasks.add_task(_with_pooled_connection, record_attempt)
+    else:
+        # The verify endpoint needs the challenge row, so write it before responding.
+        await run_in_threadpool(record_attempt, conn)
 
-    return PaymentAuthorizeResponse(
+    return PaymentAuthorizeResponse.model_construct(
         status=status,
         decision=result.decision,
         challenge_method=result.challenge_method,
@@ -567,14 +672,14 @@ async def payment_authorize(
         explain=result.explain,
         user_message=result.user_message,
         challenge_id=challenge_id,
-        card={"id": card["id"], "nickname": card["nickname"], "network": card["network"], "last4": card["last4"]},
+        card=card_summary,
         personalization_used=result.personalization_used,
-        retrieved_memories=retrieved,
+        retrieved_memories=retrieved if include_memories else None,
     )
 
 
 @app.post("/sessions/{session_id}/payment/challenge/verify", response_model=ChallengeVerifyResponse)
-async def payment_challenge_verify(
+def payment_challenge_verify(
     session_id: str,
     payload: ChallengeVerifyRequest,
     conn=Depends(get_db_conn),
@@ -590,7 +695,8 @@ async def payment_challenge_verify(
         raise HTTPException(status_code=400, detail="action must be APPROVE or DENY")
 
     if action == "DENY":
-        db.resolve_challenge(conn, challenge_id=payload.challenge_id, session_id=session_id, status="DENIED")
+        with db.transaction(conn):
+            db.resolve_challenge(conn, challenge_id=payload.challenge_id, session_id=session_id, status="DENIED")
         return ChallengeVerifyResponse(
             status="DENIED",
             challenge_id=payload.challenge_id,
@@ -598,7 +704,8 @@ async def payment_challenge_verify(
             message="User denied the challenge.",
         )
 
-    db.resolve_challenge(conn, challenge_id=payload.challenge_id, session_id=session_id, status="COMPLETED")
+    with db.transaction(conn):
+        db.resolve_challenge(conn, challenge_id=payload.challenge_id, session_id=session_id, status="COMPLETED")
     return ChallengeVerifyResponse(
         status="COMPLETED",
         challenge_id=payload.challenge_id,
@@ -1,12 +1,86 @@
-import json
-import os
+import re
 from typing import Any, Dict, Optional
 
 import httpx
 
+from backend import serialization
+from backend.backboard import HTTP2_AVAILABLE
+from backend.cache import TTLCache
+from backend.config import OPENAI_API_KEY, OPENAI_MODEL
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5.2")  # pick what you want
+# Shared keep-alive client, created on first use, so repeat lookups skip the TCP/TLS handshake.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60.0),
+            # Model responses can take a while; connecting and waiting for a pooled connection shouldn't.
+            timeout=httpx.Timeout(20.0, connect=5.0, pool=5.0),
+            headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "Content-Type": "application/json",
+            },
+        )
+    return _client
+
+
+# Static parts of the classification prompt; only the merchant/country/item lines vary per call.
+_PROMPT_HEAD = """You are a fraud-risk enrichment assistant for a DEMO issuer.
+Given a merchant name and an item description, classify the merchant category and whether it's restricted.
+
+Return ONLY valid JSON with keys:
+merchant, category, restricted, home_country, confidence, notes
+
+"""
+_PROMPT_TAIL = """
+
+Category must be one of: GROCERY, TRANSIT, APPAREL, FURNITURE, ALCOHOL, OTHER
+restricted: true if alcohol/age-restricted/regulatory purchase type
+confidence: float 0..1"""
+
+# Merchants we already know (the demo seed set plus common travel chains) are classified locally
+# instead of asking the model, but only when there is no item description: the item can change the
+# answer (a gift card at IKEA, wine at Tesco), so those still go to the model.
+# (pattern, category, restricted, home_country)
+_MERCHANT_RULES = tuple(
+    (re.compile(pattern, re.I), category, restricted, home_country)
+    for pattern, category, restricted, home_country in (
+        (r"\bica\b", "GROCERY", False, "SE"),
+        (r"\bwillys\b", "GROCERY", False, "SE"),
+        (r"\bhemk[oö]p\b", "GROCERY", False, "SE"),
+        (r"\blidl\b", "GROCERY", False, "DE"),
+        (r"\bcarrefour\b", "GROCERY", False, "FR"),
+        (r"\btesco\b", "GROCERY", False, "GB"),
+        (r"\bsj\b", "TRANSIT", False, "SE"),
+        (r"\bsncf\b", "TRANSIT", False, "FR"),
+        (r"\btrenitalia\b", "TRANSIT", False, "IT"),
+        (r"\btrainline\b", "TRANSIT", False, "GB"),
+        (r"\bh&m\b", "APPAREL", False, "SE"),
+        (r"\bzara\b", "APPAREL", False, "ES"),
+        (r"\buniqlo\b", "APPAREL", False, "JP"),
+        (r"\bikea\b", "FURNITURE", False, "SE"),
+        (r"\bsystembolaget\b", "ALCOHOL", True, "SE"),
+        (r"\balko\b", "ALCOHOL", True, "FI"),
+        (r"\bvinmonopolet\b", "ALCOHOL", True, "NO"),
+    )
+)
+
+# (merchant, country, item) -> classification or None. Merchants repeat constantly, so hits skip
+# the model call entirely. Misses (None) are kept only briefly so a bad answer can recover.
+_CACHE = TTLCache(maxsize=4096, ttl=3600.0)
+_CACHE_NEGATIVE_TTL = 60.0
+_MISS = object()
+
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 
 async def classify_merchant_and_item(
@@ -22,63 +96,69 @@ async def classify_merchant_and_item(
 
     If OPENAI_API_KEY not set, returns None.
     """
-    if not OPENAI_API_KEY:
+    if not OPENAI_API_KEY or not merchant.strip():
         return None
 
-    prompt = f"""
-You are a fraud-risk enrichment assistant for a DEMO issuer.
-Given a merchant name and an item description, classify the merchant category and whether it's restricted.
-
-Return ONLY valid JSON with keys:
-merchant, category, restricted, home_country, confidence, notes
+    if not (item_description or "").strip():
+        for pattern, category, restricted, home_country in _MERCHANT_RULES:
+            if pattern.search(merchant):
+                return {
+                    "merchant": merchant.strip(),
+                    "category": category,
+                    "restricted": restricted,
+                    "home_country": home_country,
+                    "confidence": 0.9,
+                    "notes": "Matched a known merchant rule (no item description given).",
+                }
+
+    key = (merchant.strip().casefold(), country.strip().upper(), (item_description or "").strip().casefold())
+    cached = _CACHE.get(key, _MISS)
+    if cached is not _MISS:
+        return cached
+
+    result = await _classify(merchant=merchant, country=country, item_description=item_description)
+
+    _CACHE.set(key, result, ttl=None if result is not None else _CACHE_NEGATIVE_TTL)
+    return result
+
+
+def _output_text(data: Any) -> Optional[str]:
+    # Try common response shapes: top-level output_text, else the first output_text part of
+    # each output item in turn.
+    if not isinstance(data, dict):
+        return None
+    text = data.get("output_text")
+    if text or not isinstance(data.get("output"), list):
+        return text
+    for item in data["output"]:
+        content = item.get("content") if isinstance(item, dict) else None
+        if isinstance(content, list):
+            part = next((c for c in content if isinstance(c, dict) and c.get("type") == "output_text"), None)
+            if part is not None and part.get("text"):
+                return part["text"]
+    return None
 
-Merchant: {merchant}
-Country: {country}
-Item: {item_description or ""}
 
-Category must be one of: GROCERY, TRANSIT, APPAREL, FURNITURE, ALCOHOL, OTHER
-restricted: true if alcohol/age-restricted/regulatory purchase type
-confidence: float 0..1
-""".strip()
+async def _classify(
+    *,
+    merchant: str,
+    country: str,
+    item_description: Optional[str],
+) -> Optional[Dict[str, Any]]:
+    prompt = f"{_PROMPT_HEAD}Merchant: {merchant}\nCountry: {country}\nItem: {item_description or ''}{_PROMPT_TAIL}"
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.post(
-            "https://api.openai.com/v1/responses",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": OPENAI_MODEL,
-                "input": prompt,
-            },
-        )
+    resp = await _get_client().post(
+        "https://api.openai.com/v1/responses",
+        content=serialization.dumps({"model": OPENAI_MODEL, "input": prompt}),
+    )
 
     resp.raise_for_status()
-    data = resp.json()
-
-    # Try common response shapes
-    text = None
-    if isinstance(data, dict):
-        text = data.get("output_text")
-        if not text and isinstance(data.get("output"), list):
-            # best-effort extraction
-            for item in data["output"]:
-                if isinstance(item, dict):
-                    content = item.get("content")
-                    if isinstance(content, list):
-                        for c in content:
-                            if isinstance(c, dict) and c.get("type") == "output_text":
-                                text = c.get("text")
-                                break
-                if text:
-                    break
-
+    text = _output_text(serialization.loads(resp.content))
     if not text:
         return None
 
     try:
-        obj = json.loads(text)
+        obj = serialization.loads(text)
         if isinstance(obj, dict) and obj.get("merchant") and obj.get("category"):
             return obj
     except Exception:
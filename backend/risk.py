@@ -1,14 +1,18 @@
 from __future__ import annotations
 
-import json
+import re
+import sys
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
+from backend import serialization
 
-@dataclass
+
+@dataclass(slots=True)
 class Personalization:
     current_country: Optional[str] = None
     trip_countries: List[str] = field(default_factory=list)
+    trip_country_set: Set[str] = field(default_factory=set)  # same values, for membership tests
     sms_available: Optional[bool] = None
     preferred_verification: Optional[str] = None  # PASSKEY | SMS
     daily_budget: Optional[float] = None
@@ -19,20 +23,113 @@ class Personalization:
     trusted_high: Set[str] = field(default_factory=set)
     trusted_med: Set[str] = field(default_factory=set)
     trusted_low: Set[str] = field(default_factory=set)
+    tier_map: Dict[str, str] = field(default_factory=dict)  # merchant_norm -> strongest tier
+
+    merchant_facts: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # merchant_norm -> {category, restricted}
 
-    merchant_facts: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # merchant_norm -> facts
+    # Lazily built by _personalization_used(); fixed once extract_personalization has returned.
+    used_snapshot: Optional[Dict[str, Any]] = field(default=None, repr=False, compare=False)
 
 
 def _safe_json_loads(s: str) -> Optional[Dict[str, Any]]:
     try:
-        obj = json.loads(s)
+        obj = serialization.loads(s)
         return obj if isinstance(obj, dict) else None
     except Exception:
         return None
 
 
 def _norm_merchant(name: str) -> str:
-    return (name or "").strip().lower()
+    # Interned so trust/fact lookups for the same merchant usually hit on identity.
+    return sys.intern((name or "").strip().lower())
+
+
+def _apply_profile(payload: str, p: Personalization) -> None:
+    obj = _safe_json_loads(payload)
+    if obj:
+        if obj.get("current_country"):
+            p.current_country = str(obj["current_country"]).upper().strip()
+        if isinstance(obj.get("trip_countries"), list):
+            p.trip_countries = [str(x).upper().strip() for x in obj["trip_countries"] if str(x).strip()]
+            p.trip_country_set = set(p.trip_countries)
+        if obj.get("sms_available") is not None:
+            p.sms_available = bool(obj["sms_available"])
+        if obj.get("preferred_verification"):
+            p.preferred_verification = str(obj["preferred_verification"]).upper().strip()
+        if obj.get("daily_budget") is not None:
+            try:
+                p.daily_budget = float(obj["daily_budget"])
+            except Exception:
+                pass
+
+
+def _apply_baseline(payload: str, p: Personalization) -> None:
+    obj = _safe_json_loads(payload)
+    if obj:
+        if obj.get("typical_amount_min") is not None:
+            try:
+                p.typical_amount_min = float(obj["typical_amount_min"])
+            except Exception:
+                pass
+        if obj.get("typical_amount_max") is not None:
+            try:
+                p.typical_amount_max = float(obj["typical_amount_max"])
+            except Exception:
+                pass
+
+
+_TIER_RANK = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+
+
+def _set_tier(p: Personalization, merchant_norm: str, tier: str) -> None:
+    current = p.tier_map.get(merchant_norm)
+    if current is None or _TIER_RANK[tier] > _TIER_RANK[current]:
+        p.tier_map[merchant_norm] = tier
+
+
+def _apply_trusted_high(merchant: str, p: Personalization) -> None:
+    if merchant:
+        key = _norm_merchant(merchant)
+        p.trusted_high.add(key)
+        _set_tier(p, key, "HIGH")
+
+
+def _apply_trusted_med(merchant: str, p: Personalization) -> None:
+    if merchant:
+        key = _norm_merchant(merchant)
+        p.trusted_med.add(key)
+        _set_tier(p, key, "MEDIUM")
+
+
+def _apply_trusted_low(merchant: str, p: Personalization) -> None:
+    if merchant:
+        key = _norm_merchant(merchant)
+        p.trusted_low.add(key)
+        _set_tier(p, key, "LOW")
+
+
+def _apply_merchant_facts(payload: str, p: Personalization) -> None:
+    obj = _safe_json_loads(payload)
+    if obj and obj.get("merchant"):
+        key = _norm_merchant(str(obj["merchant"]))
+        # Keep only what scoring reads (not source_url etc.), with the category already canonical;
+        # Personalization objects are cached per session.
+        p.merchant_facts[key] = {
+            "category": str(obj.get("category") or "").strip().upper(),
+            "restricted": bool(obj.get("restricted")),
+        }
+
+
+# Memory tag -> handler; each memory is "<TAG> <payload>", so one split and one lookup per memory.
+_MEMORY_HANDLERS: Dict[str, Callable[[str, Personalization], None]] = {
+    "TP_PROFILE": _apply_profile,
+    "TP_BASELINE": _apply_baseline,
+    "TP_TRUSTED_MERCHANT_HIGH": _apply_trusted_high,
+    "TP_TRUSTED_MERCHANT_MED": _apply_trusted_med,
+    "TP_TRUSTED_MERCHANT_LOW": _apply_trusted_low,
+    "TP_TRUSTED_MERCHANT": _apply_trusted_high,  # Back-compat: treat as HIGH
+    "TP_MERCHANT_FACTS": _apply_merchant_facts,
+}
 
 
 def extract_personalization(retrieved_memories: List[Dict[str, Any]]) -> Personalization:
@@ -43,71 +140,15 @@ def extract_personalization(retrieved_memories: List[Dict[str, Any]]) -> Persona
         if not mem:
             continue
 
-        if mem.startswith("TP_PROFILE"):
-            payload = mem[len("TP_PROFILE"):].strip()
-            obj = _safe_json_loads(payload)
-            if obj:
-                if obj.get("current_country"):
-                    p.current_country = str(obj["current_country"]).upper().strip()
-                if isinstance(obj.get("trip_countries"), list):
-                    p.trip_countries = [str(x).upper().strip() for x in obj["trip_countries"] if str(x).strip()]
-                if obj.get("sms_available") is not None:
-                    p.sms_available = bool(obj["sms_available"])
-                if obj.get("preferred_verification"):
-                    p.preferred_verification = str(obj["preferred_verification"]).upper().strip()
-                if obj.get("daily_budget") is not None:
-                    try:
-                        p.daily_budget = float(obj["daily_budget"])
-                    except Exception:
-                        pass
-
-        elif mem.startswith("TP_BASELINE"):
-            payload = mem[len("TP_BASELINE"):].strip()
-            obj = _safe_json_loads(payload)
-            if obj:
-                if obj.get("typical_amount_min") is not None:
-                    try:
-                        p.typical_amount_min = float(obj["typical_amount_min"])
-                    except Exception:
-                        pass
-                if obj.get("typical_amount_max") is not None:
-                    try:
-                        p.typical_amount_max = float(obj["typical_amount_max"])
-                    except Exception:
-                        pass
-
-        elif mem.startswith("TP_TRUSTED_MERCHANT_HIGH"):
-            merchant = mem[len("TP_TRUSTED_MERCHANT_HIGH"):].strip()
-            if merchant:
-                p.trusted_high.add(_norm_merchant(merchant))
-
-        elif mem.startswith("TP_TRUSTED_MERCHANT_MED"):
-            merchant = mem[len("TP_TRUSTED_MERCHANT_MED"):].strip()
-            if merchant:
-                p.trusted_med.add(_norm_merchant(merchant))
-
-        elif mem.startswith("TP_TRUSTED_MERCHANT_LOW"):
-            merchant = mem[len("TP_TRUSTED_MERCHANT_LOW"):].strip()
-            if merchant:
-                p.trusted_low.add(_norm_merchant(merchant))
-
-        elif mem.startswith("TP_TRUSTED_MERCHANT"):
-            # Back-compat: treat as HIGH
-            merchant = mem[len("TP_TRUSTED_MERCHANT"):].strip()
-            if merchant:
-                p.trusted_high.add(_norm_merchant(merchant))
-
-        elif mem.startswith("TP_MERCHANT_FACTS"):
-            payload = mem[len("TP_MERCHANT_FACTS"):].strip()
-            obj = _safe_json_loads(payload)
-            if obj and obj.get("merchant"):
-                key = _norm_merchant(str(obj["merchant"]))
-                p.merchant_facts[key] = obj
+        parts = mem.split(None, 1)
+        handler = _MEMORY_HANDLERS.get(parts[0])
+        if handler is not None:
+            handler(parts[1] if len(parts) > 1 else "", p)
 
     return p
 
 
-@dataclass
+@dataclass(slots=True)
 class Purchase:
     merchant: str
     amount: float
@@ -117,9 +158,17 @@ class Purchase:
     channel: str = "CNP"  # CNP (online) | CARD_PRESENT
     item_description: Optional[str] = None
     shipping_country: Optional[str] = None
+    merchant_norm: str = field(init=False, default="")
 
+    def __post_init__(self) -> None:
+        # Normalize once here so score_purchase can compare fields directly.
+        self.merchant_norm = _norm_merchant(self.merchant)
+        self.country = (self.country or "").strip().upper()
+        self.channel = (self.channel or "CNP").strip().upper()
+        self.shipping_country = self.shipping_country.strip().upper() if self.shipping_country else None
 
-@dataclass
+
+@dataclass(slots=True)
 class RiskResult:
     decision: str                 # APPROVE | CHALLENGE
     challenge_method: str         # NONE | PASSKEY
@@ -133,7 +182,8 @@ class RiskResult:
 
 
 def _clamp_int(x: float, lo: int = 0, hi: int = 100) -> int:
-    return int(max(lo, min(hi, round(x))))
+    y = round(x)  # round() on a float already returns an int
+    return lo if y < lo else hi if y > hi else y
 
 
 def _risk_level(score: int) -> str:
@@ -145,37 +195,68 @@ def _risk_level(score: int) -> str:
 
 
 def _merchant_tier(merchant_norm: str, p: Personalization) -> str:
-    if merchant_norm in p.trusted_high:
-        return "HIGH"
-    if merchant_norm in p.trusted_med:
-        return "MEDIUM"
-    if merchant_norm in p.trusted_low:
-        return "LOW"
-    return "LOW"
+    return p.tier_map.get(merchant_norm, "LOW")
+
+
+_GIFT_CARD_RE = re.compile(r"gift ?card|voucher|steam card|apple gift|google play", re.IGNORECASE)
 
 
 def _looks_like_gift_card(item_desc: Optional[str]) -> bool:
-    if not item_desc:
-        return False
-    s = item_desc.lower()
-    return any(k in s for k in ["gift card", "giftcard", "voucher", "steam card", "apple gift", "google play"])
+    return bool(item_desc and _GIFT_CARD_RE.search(item_desc))
+
+
+def _personalization_used(p: Personalization) -> Dict[str, Any]:
+    if p.used_snapshot is None:
+        p.used_snapshot = {
+            "current_country": p.current_country,
+            "trip_countries": p.trip_countries,
+            "sms_available": p.sms_available,
+            "preferred_verification": p.preferred_verification,
+            "typical_amount_max": p.typical_amount_max,
+            "trusted_high_count": len(p.trusted_high),
+            "trusted_med_count": len(p.trusted_med),
+            "trusted_low_count": len(p.trusted_low),
+        }
+    return p.used_snapshot
+
+
+# category -> (score delta, reason)
+_CATEGORY_ADJUSTMENTS: Dict[str, Tuple[float, str]] = {
+    "GROCERY": (-5, "Grocery purchase (low fraud profile)"),
+    "TRANSIT": (-3, "Transit purchase (common while traveling)"),
+    "APPAREL": (2, "Retail apparel purchase"),
+    "FURNITURE": (8, "Large-ticket retail category"),
+    "ALCOHOL": (5, "Restricted category purchase"),
+}
+
+# merchant trust tier -> (score delta, reason)
+_TIER_ADJUSTMENTS: Dict[str, Tuple[float, str]] = {
+    "HIGH": (-25, "High-trust merchant"),
+    "MEDIUM": (5, "Medium-trust merchant"),
+    "LOW": (15, "Low/unknown merchant"),
+}
+
+
+_EXPLAIN_TEMPLATES: Dict[str, str] = {
+    "APPROVE": "Risk score %d/100 (%s). Approved. Key factors: %s.",
+    "CHALLENGE": "Risk score %d/100 (%s). Verification required. Key factors: %s.",
+}
 
 
 def score_purchase(purchase: Purchase, personalization: Personalization, trust_score: int = 50) -> RiskResult:
     reasons: List[str] = []
     score = 0.0
 
-    merchant_norm = _norm_merchant(purchase.merchant)
-    purchase_country = (purchase.country or "").strip().upper()
+    merchant_norm = purchase.merchant_norm
+    purchase_country = purchase.country
     tier = _merchant_tier(merchant_norm, personalization)
 
     facts = personalization.merchant_facts.get(merchant_norm, {})
-    category = (facts.get("category") or "").strip().upper()
+    category = facts.get("category")
     restricted = bool(facts.get("restricted"))
 
     # Channel risk (CNP is the big bucket for card fraud value; we reflect that as a risk prior)
-    channel = (purchase.channel or "CNP").strip().upper()
-    if channel == "CNP":
+    if purchase.channel == "CNP":
         score += 12
         reasons.append("Online (card-not-present) purchase")
 
@@ -185,32 +266,21 @@ def score_purchase(purchase: Purchase, personalization: Personalization, trust_s
         reasons.append("Country mismatch vs travel mode")
 
     # Trip country reduces risk
-    if personalization.trip_countries and purchase_country in personalization.trip_countries:
+    if purchase_country in personalization.trip_country_set:
         score -= 10
         reasons.append("Purchase is in your declared trip country")
 
     # Shipping mismatch (light realism)
-    if purchase.shipping_country and personalization.current_country:
-        if purchase.shipping_country.strip().upper() != personalization.current_country:
+    if purchase.shipping_country is not None and personalization.current_country:
+        if purchase.shipping_country != personalization.current_country:
             score += 12
             reasons.append("Shipping country differs from your current travel country")
 
     # Category hint
-    if category == "GROCERY":
-        score -= 5
-        reasons.append("Grocery purchase (low fraud profile)")
-    elif category == "TRANSIT":
-        score -= 3
-        reasons.append("Transit purchase (common while traveling)")
-    elif category == "APPAREL":
-        score += 2
-        reasons.append("Retail apparel purchase")
-    elif category == "FURNITURE":
-        score += 8
-        reasons.append("Large-ticket retail category")
-    elif category == "ALCOHOL":
-        score += 5
-        reasons.append("Restricted category purchase")
+    adjustment = _CATEGORY_ADJUSTMENTS.get(category)
+    if adjustment is not None:
+        score += adjustment[0]
+        reasons.append(adjustment[1])
 
     # Item-level “high scam” prior (gift cards)
     gift_card_like = _looks_like_gift_card(purchase.item_description)
@@ -233,15 +303,9 @@ def score_purchase(purchase: Purchase, personalization: Personalization, trust_s
         reasons.append("Merchant offered DCC (extra fee risk)")
 
     # Trust tier influence
-    if tier == "HIGH":
-        score -= 25
-        reasons.append("High-trust merchant")
-    elif tier == "MEDIUM":
-        score += 5
-        reasons.append("Medium-trust merchant")
-    else:
-        score += 15
-        reasons.append("Low/unknown merchant")
+    delta, reason = _TIER_ADJUSTMENTS[tier]
+    score += delta
+    reasons.append(reason)
 
     # Trust score adjustment
     score -= (trust_score - 50) * 0.4
@@ -271,24 +335,7 @@ def score_purchase(purchase: Purchase, personalization: Personalization, trust_s
         user_message = "Unrecognized merchant — approve with passkey or decline."
 
     top_reasons = reasons[:3]
-    explain = (
-        f"Risk score {risk_score}/100 ({risk_level}). "
-        + ("Approved. " if decision == "APPROVE" else "Verification required. ")
-        + "Key factors: "
-        + "; ".join(top_reasons)
-        + "."
-    )
-
-    personalization_used = {
-        "current_country": personalization.current_country,
-        "trip_countries": personalization.trip_countries,
-        "sms_available": personalization.sms_available,
-        "preferred_verification": personalization.preferred_verification,
-        "typical_amount_max": personalization.typical_amount_max,
-        "trusted_high_count": len(personalization.trusted_high),
-        "trusted_med_count": len(personalization.trusted_med),
-        "trusted_low_count": len(personalization.trusted_low),
-    }
+    explain = _EXPLAIN_TEMPLATES[decision] % (risk_score, risk_level, "; ".join(top_reasons))
 
     return RiskResult(
         decision=decision,
@@ -299,5 +346,5 @@ def score_purchase(purchase: Purchase, personalization: Personalization, trust_s
         reasons=top_reasons,
         explain=explain,
         user_message=user_message,
-        personalization_used=personalization_used,
+        personalization_used=_personalization_used(personalization),
     )
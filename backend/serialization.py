@@ -0,0 +1,28 @@
+# backend/serialization.py
+# JSON helpers: use orjson when it is installed, fall back to the stdlib otherwise.
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+    import json
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    # Both orjson.JSONDecodeError and json.JSONDecodeError subclass ValueError.
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    # Compact UTF-8 bytes either way, ready to send as a request body.
+    if orjson is not None:
+        return orjson.dumps(obj, default=default)
+    return json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps_str(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    # Same encoding as dumps(), as text for TEXT columns.
+    return dumps(obj, default=default).decode()
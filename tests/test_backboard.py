@@ -0,0 +1,142 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi import HTTPException
+
+from backend.backboard import BackboardClient, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patcher = mock.patch("backend.backboard.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(request_volume_threshold=2, error_threshold_percentage=50.0, sleep_window=10.0)
+
+    def _open(self) -> None:
+        self.breaker.on_failure()
+        self.breaker.on_failure()
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_open_half_open_closed_recovery(self) -> None:
+        self._open()
+        self.assertFalse(self.breaker.allow())
+
+        self.clock.now += 10.0
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  # only one trial at a time
+
+        self.breaker.on_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self) -> None:
+        self._open()
+        self.clock.now += 10.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.on_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_abandoned_trial_frees_the_slot(self) -> None:
+        self._open()
+        self.clock.now += 10.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.on_abandoned()
+        self.assertTrue(self.breaker.allow())
+
+
+class SendWithFallbackTest(unittest.TestCase):
+    def _client(self, handler) -> BackboardClient:
+        bb = BackboardClient("k", "https://bb.test/api")
+        asyncio.run(bb.aclose())
+        bb._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return bb
+
+    def test_not_found_trial_closes_breaker(self) -> None:
+        clock = FakeClock()
+        bb = self._client(lambda request: httpx.Response(404))
+        with mock.patch("backend.backboard.time.monotonic", clock):
+            bb._breaker._opened_at = clock.now
+            clock.now += bb._breaker.sleep_window
+
+            with self.assertRaises(HTTPException) as ctx:
+                asyncio.run(bb._send_with_fallback("GET", ("a", "b")))
+            self.assertEqual(ctx.exception.status_code, 502)
+            self.assertEqual(bb._breaker.state, "closed")
+
+    def test_write_is_not_retried_after_server_error(self) -> None:
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            return httpx.Response(503)
+
+        bb = self._client(handler)
+        with self.assertRaises(HTTPException):
+            asyncio.run(bb._send_with_fallback("POST", ("a",), json_payload={"x": 1}))
+        self.assertEqual(calls, ["/api/a"])
+        self.assertEqual(list(bb._breaker._outcomes), [False])
+
+    def test_read_is_retried_after_unavailable(self) -> None:
+        calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            calls.append(request.url.path)
+            return httpx.Response(503) if len(calls) == 1 else httpx.Response(200, json={})
+
+        bb = self._client(handler)
+        with mock.patch("backend.backboard.asyncio.sleep", mock.AsyncMock()):
+            resp = asyncio.run(bb._send_with_fallback("GET", ("a",)))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(list(bb._breaker._outcomes), [True])
+
+
+class QueryCacheTest(unittest.TestCase):
+    def test_write_during_inflight_query_is_not_masked(self) -> None:
+        bb = BackboardClient("k", "https://bb.test/api")
+        profile = [{"memory": "TP_PROFILE {}"}]
+        calls = []
+
+        async def scenario():
+            gate = asyncio.Event()
+
+            async def fetch(**kwargs):
+                calls.append(kwargs)
+                if len(calls) == 1:
+                    await gate.wait()
+                    return []
+                return profile
+
+            bb._query_memories_uncached = fetch
+            bb._request_with_fallback = mock.AsyncMock(return_value={})
+
+            first = asyncio.ensure_future(bb.query_memories(thread_id="t", assistant_id="a", query="q"))
+            await asyncio.sleep(0)
+            await bb.add_memory(assistant_id="a", content="TP_PROFILE {}")
+            gate.set()
+            self.assertEqual(await first, [])
+
+            self.assertEqual(await bb.query_memories(thread_id="t", assistant_id="a", query="q"), profile)
+            self.assertEqual(await bb.query_memories(thread_id="t", assistant_id="a", query="q"), profile)
+            await bb.aclose()
+
+        asyncio.run(scenario())
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
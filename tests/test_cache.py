@@ -0,0 +1,77 @@
+import sys
+import threading
+import unittest
+from unittest import mock
+
+from backend.cache import TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self) -> None:
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "a" is now hotter than "b"
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_update_refreshes_recency(self) -> None:
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("a", 10)
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 10)
+        self.assertIsNone(cache.get("b"))
+
+    def test_entries_expire(self) -> None:
+        now = [100.0]
+        with mock.patch("backend.cache.time.monotonic", lambda: now[0]):
+            cache = TTLCache(maxsize=4, ttl=10.0)
+            cache.set("a", None)
+            cache.set("b", 2, ttl=1.0)
+            missing = object()
+            self.assertIsNone(cache.get("a", missing))
+            now[0] += 5.0
+            self.assertIs(cache.get("b", missing), missing)
+            now[0] += 5.0
+            self.assertIs(cache.get("a", missing), missing)
+            self.assertEqual(len(cache), 0)
+
+    def test_concurrent_access_from_threads(self) -> None:
+        cache = TTLCache(maxsize=64, ttl=60.0)
+        errors = []
+        start = threading.Barrier(8)
+
+        def worker(n: int) -> None:
+            start.wait()
+            try:
+                for i in range(5000):
+                    key = (n * 7 + i) % 200
+                    # Already-expired entries exercise the get() -> del path alongside pop().
+                    cache.set(key, i, ttl=0.0 if i % 2 else None)
+                    cache.get((key * 3) % 200)
+                    cache.get(key)
+                    if i % 11 == 0:
+                        cache.pop(key)
+            except Exception as exc:  # pragma: no cover - only reached on a race
+                errors.append(exc)
+
+        # Switch threads as often as possible so unsynchronized get/pop interleavings show up.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(cache), 64)
+        self.assertEqual(list(cache._data), list(dict.fromkeys(cache._data)))
+
+
+if __name__ == "__main__":
+    unittest.main()